@@ -0,0 +1,13 @@
+def pytest_sessionstart(session):
+    """
+    Тот же isolated_environment, что и у manage.py test: pytest-django
+    TEST_RUNNER не читает. Включается до сбора тестов, потому что уже
+    сбор обращается к django.core.cache.cache в модулях тестов.
+    """
+    from core.testing import isolated_environment
+    session.yatube_environment = isolated_environment()
+    session.yatube_environment.__enter__()
+
+
+def pytest_sessionfinish(session):
+    session.yatube_environment.__exit__(None, None, None)
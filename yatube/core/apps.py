@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import check_connections, configure_sqlite, mark_checked
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(mark_checked)
+        request_started.connect(check_connections)
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+
+from .metrics import PAGE_CACHE_REQUESTS
+
+GENERATION_KEY = 'content_generation'
+USER_SECTION_SALT = 'core.usersection'
+USER_SECTION_RE = re.compile(r'<!--usersection:([\w.:-]+)-->')
+# Сколько держится блокировка пересборки и сколько её ждут конкуренты.
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def relocated_caches(directory):
+    """
+    Настройки CACHES с теми же бэкендами, но в каталоге directory:
+    тесты и бенчмарки не трогают общий кеш запущенного сервера.
+    """
+    return {
+        alias: dict(config, LOCATION=os.path.join(directory, alias))
+        for alias, config in settings.CACHES.items()
+    }
+
+
+def get_generation():
+    """Текущее поколение контента, входит в ключи кеша страниц."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Стартуем со времени, чтобы после вытеснения ключа поколение
+        # не вернулось к уже использованному значению.
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """Сдвигает поколение: все закешированные страницы устаревают."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time() * 1000), None)
+
+
+def bump_generation_on_commit():
+    """
+    Сдвигает поколение сразу, чтобы чтения в той же транзакции не взяли
+    страницу, собранную до записи, и ещё раз после коммита: страница,
+    которую другой запрос успел собрать по старым данным до коммита,
+    иначе прожила бы под новым поколением до PAGE_CACHE_TIMEOUT.
+    """
+    bump_generation()
+    transaction.on_commit(bump_generation)
+
+
+def page_cache_key(key_prefix, request):
+    # Анонимам отдаётся готовая страница, остальным общий каркас
+    # с метками вместо пользовательских фрагментов.
+    variant = 'user' if request.user.is_authenticated else 'anon'
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{key_prefix}:{get_generation()}:{variant}:{path}'
+
+
+def user_section_placeholder(template_name, values):
+    token = signing.dumps([template_name, values], salt=USER_SECTION_SALT)
+    return f'<!--usersection:{token}-->'
+
+
+def render_user_sections(content, request):
+    """Подставляет в каркас страницы фрагменты текущего пользователя."""
+    def render_section(match):
+        try:
+            template_name, values = signing.loads(
+                match.group(1), salt=USER_SECTION_SALT
+            )
+        except signing.BadSignature:
+            return ''
+        return render_to_string(template_name, values, request=request)
+
+    return USER_SECTION_RE.sub(render_section, content.decode()).encode()
+
+
+def wait_for(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    return None
+
+
+def build_response(cached, request):
+    content, content_type = cached
+    if request.user.is_authenticated:
+        content = render_user_sections(content, request)
+    response = HttpResponse(content, content_type=content_type)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_page_versioned(timeout, key_prefix):
+    """
+    Кеширует GET-ответ представления в общем кеше до смены поколения.
+    Для вошедших пользователей кешируется каркас страницы, а фрагменты
+    из {% usersection %} отрисовываются на каждый запрос.
+    Одновременные промахи по одному ключу пересобирает один запрос,
+    остальные ждут его результат. Это надёжно только там, где add()
+    атомарен; на файловом кеше изредка пересоберут двое.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_cache_key(key_prefix, request)
+            cached = cache.get(key)
+            if cached is not None:
+                PAGE_CACHE_REQUESTS.inc(prefix=key_prefix, result='hit')
+                return build_response(cached, request)
+            lock_key = f'{key}:lock'
+            owns_lock = cache.add(lock_key, True, LOCK_TIMEOUT)
+            if not owns_lock:
+                cached = wait_for(key)
+                if cached is not None:
+                    PAGE_CACHE_REQUESTS.inc(prefix=key_prefix, result='wait')
+                    return build_response(cached, request)
+            PAGE_CACHE_REQUESTS.inc(prefix=key_prefix, result='miss')
+            request.defer_user_sections = request.user.is_authenticated
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(
+                        key,
+                        (response.content, response['Content-Type']),
+                        timeout
+                    )
+            finally:
+                request.defer_user_sections = False
+                if owns_lock:
+                    cache.delete(lock_key)
+            if request.user.is_authenticated and not response.streaming:
+                response.content = render_user_sections(
+                    response.content, request
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
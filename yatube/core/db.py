@@ -0,0 +1,82 @@
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import (DatabaseError, OperationalError, connection,
+                       connections, transaction)
+
+# Паузы между попытками записи: экспонента с джиттером, чтобы
+# столкнувшиеся писатели не повторяли запрос одновременно.
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+# Постоянное соединение проверяется не чаще раза в столько секунд,
+# чтобы проверка не добавляла запрос к каждому ответу.
+HEALTH_CHECK_INTERVAL = 10
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Выставляет PRAGMA из settings.SQLITE_PRAGMAS новому соединению."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def mark_checked(sender, connection, **kwargs):
+    connection.health_checked_at = time.monotonic()
+
+
+def is_alive(conn):
+    # У SQLite is_usable() всегда True, поэтому проверяем запросом.
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return False
+    return True
+
+
+def check_connections(**kwargs):
+    """
+    Проверяет постоянные соединения (CONN_MAX_AGE) в начале запроса
+    и закрывает сломанные: Django откроет новое при первом запросе.
+    """
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is None or conn.in_atomic_block:
+            continue
+        if now - getattr(conn, 'health_checked_at', 0) < HEALTH_CHECK_INTERVAL:
+            continue
+        conn.health_checked_at = now
+        if not is_alive(conn):
+            conn.close()
+
+
+def is_locked(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def retry_on_locked(func):
+    """
+    Выполняет func в транзакции и повторяет её с задержкой, если SQLite
+    ответил "database is locked". Во внешней транзакции повторять нечего:
+    ошибка уходит наверх, её повторит внешний retry_on_locked.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        attempts = settings.SQLITE_WRITE_ATTEMPTS
+        for attempt in range(1, attempts + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if attempt == attempts or not is_locked(error):
+                    raise
+            delay = min(RETRY_BASE_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+            time.sleep(random.uniform(delay / 2, delay))
+    return wrapper
@@ -0,0 +1,123 @@
+import time
+from contextvars import ContextVar
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.template.backends.django import DjangoTemplates, Template
+
+_metrics = ContextVar('request_metrics', default=None)
+_MISSING = object()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: SQL, кеш и отрисовка шаблонов."""
+
+    __slots__ = (
+        'started', 'queries', 'db_time', 'cache_hits', 'cache_misses',
+        'cache_time', 'template_time', 'rendering',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper: время каждого SQL-запроса.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def start_metrics():
+    metrics = RequestMetrics()
+    return metrics, _metrics.set(metrics)
+
+
+def stop_metrics(token):
+    _metrics.reset(token)
+
+
+def current_metrics():
+    """Счётчики текущего запроса или None вне запроса."""
+    return _metrics.get()
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания, промахи и время обращений к кешу."""
+
+    def get(self, key, default=None, version=None):
+        metrics = _metrics.get()
+        if metrics is None:
+            return super().get(key, default, version)
+        started = time.perf_counter()
+        value = super().get(key, _MISSING, version)
+        metrics.cache_time += time.perf_counter() - started
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def _timed(self, method, *args, **kwargs):
+        metrics = _metrics.get()
+        if metrics is None:
+            return method(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.cache_time += time.perf_counter() - started
+
+    def set(self, *args, **kwargs):
+        return self._timed(super().set, *args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._timed(super().add, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._timed(super().delete, *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._timed(super().incr, *args, **kwargs)
+
+
+class InstrumentedFileBasedCache(InstrumentedCacheMixin, FileBasedCache):
+    pass
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _metrics.get()
+        # Вложенные render_to_string уже входят во время внешнего шаблона.
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблонный движок Django, который замеряет время отрисовки."""
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return InstrumentedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
@@ -0,0 +1,30 @@
+from contextvars import ContextVar
+
+_memo = ContextVar('request_memo', default=None)
+
+
+class RequestMemoMiddleware:
+    """Заводит на время запроса память для memoize."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _memo.reset(token)
+
+
+def memoize(key, factory):
+    """
+    Возвращает результат factory(), вычисленный в этом запросе
+    по ключу key не больше одного раза. Вне запроса просто зовёт factory.
+    """
+    memo = _memo.get()
+    if memo is None:
+        return factory()
+    if key not in memo:
+        memo[key] = factory()
+    return memo[key]
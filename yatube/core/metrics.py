@@ -0,0 +1,234 @@
+import atexit
+import bisect
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Каждый процесс копит приращения в памяти и раз в FLUSH_INTERVAL
+# секунд складывает их в общий SQLite-файл, откуда /metrics читает
+# сумму по всем воркерам.
+FLUSH_INTERVAL = 5
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+REGISTRY = {}
+_pending = defaultdict(float)
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _add(sample, labels, amount):
+    key = (sample, json.dumps(sorted(labels.items())))
+    with _lock:
+        _pending[key] += amount
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY[name] = self
+
+    def inc(self, amount=1, **labels):
+        _add(self.name, labels, amount)
+
+    def samples(self, rows):
+        return [
+            (self.name, labels, value)
+            for sample, labels, value in rows if sample == self.name
+        ]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        REGISTRY[name] = self
+
+    def observe(self, value, **labels):
+        index = bisect.bisect_left(self.buckets, value)
+        bound = (
+            format_bound(self.buckets[index])
+            if index < len(self.buckets) else '+Inf'
+        )
+        _add(f'{self.name}_bucket', dict(labels, le=bound), 1)
+        _add(f'{self.name}_sum', labels, value)
+        _add(f'{self.name}_count', labels, 1)
+
+    def samples(self, rows):
+        """В хранилище корзины не накопительные, Prometheus ждёт сумм."""
+        bounds = [format_bound(bound) for bound in self.buckets] + ['+Inf']
+        buckets = defaultdict(dict)
+        totals = []
+        for sample, labels, value in rows:
+            if sample == f'{self.name}_bucket':
+                labels = dict(labels)
+                le = labels.pop('le')
+                buckets[tuple(sorted(labels.items()))][le] = value
+            elif sample in (f'{self.name}_sum', f'{self.name}_count'):
+                totals.append((sample, labels, value))
+        result = []
+        for labels, counts in sorted(buckets.items()):
+            total = 0
+            for bound in bounds:
+                total += counts.get(bound, 0)
+                result.append(
+                    (f'{self.name}_bucket', dict(labels, le=bound), total)
+                )
+        return result + totals
+
+
+def format_bound(bound):
+    return repr(float(bound))
+
+
+def connect():
+    connection = sqlite3.connect(settings.METRICS_DB, timeout=5)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS metrics ('
+        'sample TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+        'PRIMARY KEY (sample, labels))'
+    )
+    return connection
+
+
+def flush(force=False):
+    """Переносит накопленные приращения процесса в общее хранилище."""
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    with _lock:
+        _last_flush = now
+        if not _pending:
+            return
+        pending = dict(_pending)
+        _pending.clear()
+    try:
+        connection = connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT INTO metrics (sample, labels, value) '
+                    'VALUES (?, ?, ?) ON CONFLICT (sample, labels) '
+                    'DO UPDATE SET value = value + excluded.value',
+                    [
+                        (sample, labels, value)
+                        for (sample, labels), value in pending.items()
+                    ]
+                )
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        logger.exception('Не удалось сохранить метрики')
+        with _lock:
+            for key, value in pending.items():
+                _pending[key] += value
+
+
+atexit.register(flush, force=True)
+
+
+def read_rows():
+    connection = connect()
+    try:
+        rows = connection.execute(
+            'SELECT sample, labels, value FROM metrics'
+        ).fetchall()
+    finally:
+        connection.close()
+    return [
+        (sample, dict(json.loads(labels)), value)
+        for sample, labels, value in rows
+    ]
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+                '\n', '\\n'
+            )
+        )
+        for name, value in labels.items()
+    )
+    return f'{{{pairs}}}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render():
+    """Все метрики всех процессов в текстовом формате Prometheus."""
+    flush(force=True)
+    rows = sorted(
+        read_rows(), key=lambda row: (row[0], sorted(row[1].items()))
+    )
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for sample, labels, value in metric.samples(rows):
+            lines.append(
+                f'{sample}{format_labels(labels)} {format_value(value)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Очищает метрики процесса и хранилища, нужно тестам."""
+    with _lock:
+        _pending.clear()
+    connection = connect()
+    try:
+        with connection:
+            connection.execute('DELETE FROM metrics')
+    finally:
+        connection.close()
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса по имени URL.'
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries_total', 'SQL-запросы по имени URL.'
+)
+DB_SECONDS = Counter(
+    'yatube_db_seconds_total', 'Время SQL-запросов по имени URL.'
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кешу на чтение по имени URL: hit или miss.'
+)
+PAGE_CACHE_REQUESTS = Counter(
+    'yatube_page_cache_requests_total',
+    'Запросы к кешу страниц по префиксу: hit, miss или wait.'
+)
+
+
+def observe_request(view, metrics, total):
+    REQUEST_SECONDS.observe(total, view=view)
+    DB_QUERIES.inc(metrics.queries, view=view)
+    DB_SECONDS.inc(metrics.db_time, view=view)
+    if metrics.cache_hits:
+        CACHE_REQUESTS.inc(metrics.cache_hits, view=view, result='hit')
+    if metrics.cache_misses:
+        CACHE_REQUESTS.inc(metrics.cache_misses, view=view, result='miss')
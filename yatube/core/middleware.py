@@ -0,0 +1,62 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics as registry
+from .instrumentation import start_metrics, stop_metrics
+
+logger = logging.getLogger('yatube.requests')
+
+
+def server_timing(metrics, total):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};'
+        f'desc="SQL: {metrics.queries}"',
+        f'cache;dur={metrics.cache_time * 1000:.1f};'
+        f'desc="hit {metrics.cache_hits}, miss {metrics.cache_misses}"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+class RequestTimingMiddleware:
+    """
+    Замеряет запрос: общее время, число и время SQL-запросов, попадания
+    и промахи кеша, время отрисовки шаблонов. Результат уходит
+    в заголовок Server-Timing и одной JSON-строкой в лог
+    yatube.requests. Время шаблонов включает SQL ленивых queryset.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = start_metrics()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+            total = metrics.elapsed()
+        finally:
+            stop_metrics(token)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe_request(view, metrics, total)
+        registry.flush()
+        response['Server-Timing'] = server_timing(metrics, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'cache_ms': round(metrics.cache_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+        }, ensure_ascii=False))
+        return response
@@ -0,0 +1,48 @@
+from django import template
+from django.template.base import token_kwargs
+
+from core.cache import user_section_placeholder
+
+register = template.Library()
+
+
+class UserSectionNode(template.Node):
+    def __init__(self, template_name, extra_context):
+        self.template_name = template_name
+        self.extra_context = extra_context
+
+    def render(self, context):
+        template_name = self.template_name.resolve(context)
+        values = {
+            name: value.resolve(context)
+            for name, value in self.extra_context.items()
+        }
+        request = context.get('request')
+        if getattr(request, 'defer_user_sections', False):
+            return user_section_placeholder(template_name, values)
+        section = context.template.engine.get_template(template_name)
+        with context.push(**values):
+            return section.render(context)
+
+
+@register.tag
+def usersection(parser, token):
+    """
+    Подключает зависящий от пользователя фрагмент:
+    {% usersection 'includes/header.html' key=value %}.
+    При кешировании страницы вместо фрагмента выводится метка,
+    которую core.cache заменяет отрисовкой для текущего пользователя.
+    Значения должны сериализоваться в JSON.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} tag takes at least one argument'
+        )
+    template_name = parser.compile_filter(bits[1])
+    extra_context = token_kwargs(bits[2:], parser, support_legacy=False)
+    if len(extra_context) != len(bits) - 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} tag accepts only key=value arguments'
+        )
+    return UserSectionNode(template_name, extra_context)
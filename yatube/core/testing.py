@@ -0,0 +1,53 @@
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import metrics
+from .cache import relocated_caches
+
+
+@contextmanager
+def isolated_environment():
+    """
+    Свои кеш и хранилище метрик во временном каталоге: общие файлы
+    запущенного сервера в /tmp тесты не читают, не пишут и не очищают.
+    Нужен и manage.py test, и pytest: pytest-django TEST_RUNNER не читает.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='yatube_test_')
+    overrides = override_settings(
+        CACHES=relocated_caches(temp_dir),
+        METRICS_DB=os.path.join(temp_dir, 'metrics.sqlite3'),
+    )
+    overrides.enable()
+    try:
+        yield temp_dir
+    finally:
+        # Иначе накопленное допишет в общее хранилище atexit.
+        metrics.flush(force=True)
+        overrides.disable()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    """
+    Запускает тесты в isolated_environment. Строки лога запросов
+    в тестах только засоряют вывод, они приглушены.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.environment = isolated_environment()
+        self.environment.__enter__()
+        self.request_logger = logging.getLogger('yatube.requests')
+        self.request_log_level = self.request_logger.level
+        self.request_logger.setLevel(logging.WARNING)
+
+    def teardown_test_environment(self, **kwargs):
+        self.request_logger.setLevel(self.request_log_level)
+        self.environment.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
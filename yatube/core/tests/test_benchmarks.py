@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from posts.models import Post
+
+
+class BenchmarkViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'seed_yatube', users=20, groups=2, posts=40, comments=20,
+            follows=3, seed=1, stdout=StringIO()
+        )
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'report.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark_views', iterations=2, warmup=0, output=self.output,
+            stdout=StringIO(), **options
+        )
+        with open(self.output) as file:
+            return json.load(file)
+
+    def test_report_covers_views(self):
+        """Отчёт содержит задержки, запросы и память каждого сценария"""
+        post_count = Post.objects.count()
+        report = self.benchmark()
+        self.assertEqual(set(report['views']), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment',
+        })
+        for result in report['views'].values():
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['peak_kb'], 0)
+        self.assertEqual(report['dataset']['post'], post_count)
+        self.assertEqual(Post.objects.count(), post_count)
+
+    def test_cold_run_uses_own_cache(self):
+        """Холодный прогон очищает свой кеш, а не общий"""
+        cache.set('server-page', 'kept')
+        report = self.benchmark(only=['index'])
+        self.assertEqual(cache.get('server-page'), 'kept')
+        self.assertIn('карточки постов', report['cold_layers'])
+        self.assertEqual(
+            self.benchmark(only=['index'], warm_cache=True)['cold_layers'],
+            []
+        )
+
+    def test_compare_detects_query_regression(self):
+        """Рост числа запросов относительно базового отчёта - ошибка"""
+        report = self.benchmark(only=['index'])
+        report['views']['index']['queries'] -= 1
+        report['views']['index']['p95_ms'] *= 100
+        baseline = os.path.join(self.directory, 'baseline.json')
+        with open(baseline, 'w') as file:
+            json.dump(report, file)
+        with self.assertRaises(CommandError):
+            self.benchmark(only=['index'], compare=baseline)
@@ -0,0 +1,76 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from posts.models import Comment, Post, User
+
+from ..db import check_connections, retry_on_locked
+
+
+class SQLiteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        """Соединение получает PRAGMA из settings.SQLITE_PRAGMAS"""
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+
+
+class SQLiteWritesTest(TransactionTestCase):
+    def test_retry_on_locked(self):
+        """Запись повторяется при блокировке и только при ней"""
+        calls = []
+
+        @retry_on_locked
+        def flaky(error):
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError(error)
+            return 'ok'
+
+        with mock.patch('core.db.time.sleep') as sleep:
+            self.assertEqual(flaky('database is locked'), 'ok')
+            self.assertEqual(sleep.call_count, 2)
+            calls.clear()
+            with self.assertRaises(OperationalError):
+                flaky('no such table: posts_post')
+        self.assertEqual(calls, [True])
+
+    def test_benchmark_reports_phases(self):
+        """benchmark_sqlite замеряет оба режима и убирает за собой"""
+        user = User.objects.create_user(username='bench')
+        Post.objects.create(author=user, text='Пост')
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', readers=1, writers=1, duration=0.2,
+            baseline=True, stdout=out
+        )
+        self.assertIn('baseline', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+
+
+class ConnectionHealthCheckTest(TransactionTestCase):
+    def test_broken_connection_is_closed(self):
+        """Сломанное постоянное соединение закрывается в начале запроса"""
+        connection.ensure_connection()
+        connection.health_checked_at = time.monotonic() - 60
+        with mock.patch('core.db.is_alive', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            check_connections()
+        close.assert_called_once_with()
+
+    def test_recently_checked_connection_is_not_pinged(self):
+        """Свежепроверенное соединение не тратит запрос на проверку"""
+        connection.ensure_connection()
+        check_connections()
+        with self.assertNumQueries(0):
+            check_connections()
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Group, Post, User
+from posts.utils import get_author, get_group
+
+from ..memo import RequestMemoMiddleware
+
+
+class RequestMemoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='memo')
+        self.group = Group.objects.create(
+            title='Группа', slug='memo-group', description='Описание'
+        )
+        Post.objects.create(author=self.author, group=self.group, text='Пост')
+
+    def test_lookups_run_once_per_request(self):
+        """Повторный поиск автора и группы в запросе не ходит в базу"""
+        def view(request):
+            for _ in range(2):
+                self.assertEqual(get_author('memo'), self.author)
+                self.assertEqual(get_group('memo-group'), self.group)
+            return HttpResponse()
+
+        middleware = RequestMemoMiddleware(view)
+        for _ in range(2):
+            with self.assertNumQueries(2):
+                middleware(RequestFactory().get('/'))
+
+    def test_no_memo_outside_request(self):
+        """Вне запроса результаты не запоминаются"""
+        with self.assertNumQueries(2):
+            get_author('memo')
+            get_author('memo')
+
+    def test_profile_has_no_duplicate_queries(self):
+        """Страница профиля не выполняет один и тот же запрос дважды"""
+        client = Client()
+        client.force_login(User.objects.create_user(username='reader'))
+        with CaptureQueriesContext(connection) as context:
+            client.get(reverse('posts:profile', args=['memo']))
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(len(queries), len(set(queries)))
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import User
+
+from .. import metrics
+
+
+class MetricsEndpointTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.store = override_settings(
+            METRICS_DB=os.path.join(cls.directory, 'metrics.sqlite3')
+        )
+        cls.store.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.disable()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def scrape(self):
+        response = self.staff_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_metrics_are_staff_only(self):
+        """/metrics недоступен анонимам и обычным пользователям"""
+        user = User.objects.create_user(username='regular')
+        client = Client()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 302)
+        client.force_login(user)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 302)
+
+    def test_page_cache_and_latency_metrics(self):
+        """Метрики видят промах и попадание кеша index и задержки"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        body = self.scrape()
+        self.assertIn(
+            'yatube_page_cache_requests_total'
+            '{prefix="index_page",result="hit"} 1',
+            body
+        )
+        self.assertIn(
+            'yatube_page_cache_requests_total'
+            '{prefix="index_page",result="miss"} 1',
+            body
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            body
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            body
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', body)
+
+    def test_metrics_are_summed_across_workers(self):
+        """Приращения разных процессов складываются в общем хранилище"""
+        metrics.DB_QUERIES.inc(3, view='posts:index')
+        metrics.flush(force=True)
+        # Так же свои приращения сохраняет другой воркер.
+        metrics.DB_QUERIES.inc(4, view='posts:index')
+        metrics.flush(force=True)
+        self.assertIn(
+            'yatube_db_queries_total{view="posts:index"} 7', self.scrape()
+        )
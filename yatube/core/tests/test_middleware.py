@@ -0,0 +1,42 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Post, User
+
+
+class RequestTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='timed')
+        Post.objects.create(author=self.user, text='Пост')
+
+    def get_logged(self, url):
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        return response, json.loads(logs.records[-1].getMessage()), queries
+
+    def test_server_timing_header_and_log(self):
+        """Метрики запроса попадают в Server-Timing и в лог"""
+        response, record, queries = self.get_logged(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'cache;dur=', 'tpl;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertEqual(record['path'], reverse('posts:index'))
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['db_queries'], len(queries))
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+
+    def test_cached_page_counts_cache_hits(self):
+        """Ответ из кеша страниц виден как попадание без шаблонов"""
+        self.client.get(reverse('posts:index'))
+        _, record, _ = self.get_logged(reverse('posts:index'))
+        self.assertGreaterEqual(record['cache_hits'], 2)
+        self.assertEqual(record['cache_misses'], 0)
+        self.assertEqual(record['db_queries'], 0)
+        self.assertEqual(record['template_ms'], 0)
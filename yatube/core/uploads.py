@@ -0,0 +1,43 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, который не записан, потому что больше MAX_UPLOAD_SIZE."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class SizeLimitUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет каждый файл во временный файл на диске, как
+    TemporaryFileUploadHandler, но перестаёт писать, как только файл
+    превысил MAX_UPLOAD_SIZE. Остаток файла дочитывается из запроса
+    и отбрасывается, а вместо него форма получает RejectedUpload.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if not self.rejected and self.received > settings.MAX_UPLOAD_SIZE:
+            self.rejected = True
+            # Временный файл удаляется при закрытии.
+            self.file.close()
+        if self.rejected:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.received
+            )
+        return super().file_complete(file_size)
@@ -1,7 +1,11 @@
 from http import HTTPStatus
 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import metrics as registry
+
 
 def page_not_found(request, exception):
     return render(
@@ -18,3 +22,11 @@ def csrf_failure(request, reason=''):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'priority',
+        'attempts',
+        'run_at',
+        'failed'
+    )
+    search_fields = ('name', 'dedupe_key')
+    list_filter = ('failed', 'name')
+    empty_value_display = '-пусто-'
@@ -0,0 +1,56 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import work
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает пул воркеров очереди задач. Процессов с этой командой '
+        'можно запустить сколько угодно: задачи не выполнятся дважды.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=settings.JOBS_WORKERS
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза, когда готовых задач нет, в секундах.'
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            default=settings.JOBS_VISIBILITY_TIMEOUT,
+            help='Через сколько секунд задачу умершего воркера '
+                 'заберёт другой.'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выполнить готовые задачи и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        threads = [
+            threading.Thread(
+                target=work,
+                args=(
+                    stop, options['poll_interval'],
+                    options['visibility_timeout'], options['burst']
+                ),
+                name=f'jobs-{number}'
+            )
+            for number in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Воркеров запущено: {len(threads)}')
+        # join с таймаутом, чтобы главный поток получал сигналы.
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    Задача фоновой очереди. Выполненные задачи удаляются, в таблице
+    остаются только ждущие, выполняющиеся и упавшие.
+    """
+    name = models.CharField('Задача', max_length=200)
+    payload = models.TextField('Аргументы (JSON)', default='{}')
+    priority = models.SmallIntegerField(
+        'Приоритет',
+        default=0,
+        help_text='Задачи с большим приоритетом выполняются раньше'
+    )
+    dedupe_key = models.CharField(
+        'Ключ дедупликации',
+        max_length=200,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text='Пока задача с этим ключом не выполнена, вторая '
+                  'такая же в очередь не встаёт'
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток')
+    # Взятая воркером задача сдвигается на таймаут видимости: если
+    # воркер умрёт, её заберёт другой, когда run_at наступит снова.
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    failed = models.BooleanField('Упала', default=False)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(fields=['failed', '-priority', 'run_at']),
+        ]
+
+    def __str__(self):
+        return self.name
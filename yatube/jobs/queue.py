@@ -0,0 +1,196 @@
+import json
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from core import metrics
+from core.db import retry_on_locked
+from django.conf import settings
+from django.db import (IntegrityError, close_old_connections, connection,
+                       transaction)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Сколько готовых задач просматривать при захвате: если первую
+# перехватил другой воркер, берётся следующая.
+CLAIM_CANDIDATES = 5
+
+TASKS = {}
+
+JOBS = metrics.Counter(
+    'yatube_jobs_total',
+    'Выполненные задачи очереди по имени: done, retry, postponed или failed.'
+)
+JOB_SECONDS = metrics.Histogram(
+    'yatube_job_duration_seconds',
+    'Время выполнения задачи очереди по имени.'
+)
+
+
+class Postpone(Exception):
+    """
+    Задача просит выполнить её снова через delay секунд. Это не ошибка:
+    попытка не засчитывается, dedupe_key остаётся занят.
+    """
+
+    def __init__(self, delay):
+        super().__init__(delay)
+        self.delay = delay
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def task(func):
+    """
+    Регистрирует функцию как задачу очереди. Аргументы задачи
+    хранятся в JSON, поэтому передаются только именованные
+    и только простые значения.
+    """
+    TASKS[task_name(func)] = func
+    return func
+
+
+def resolve(name):
+    # Воркер мог ещё не импортировать модуль с задачей.
+    if name not in TASKS:
+        import_string(name)
+    return TASKS[name]
+
+
+@retry_on_locked
+def enqueue(func, kwargs=None, *, priority=0, dedupe_key=None, delay=0,
+            max_attempts=None):
+    """
+    Ставит задачу в очередь в текущей транзакции: воркеры увидят её
+    вместе с остальными изменениями запроса или не увидят вовсе.
+    Задача с занятым dedupe_key не ставится, возвращается None.
+    """
+    name = task_name(func)
+    if name not in TASKS:
+        raise ValueError(f'{name} не зарегистрирована через @task')
+    job = Job(
+        name=name,
+        payload=json.dumps(kwargs or {}),
+        priority=priority,
+        dedupe_key=dedupe_key,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay)
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        if dedupe_key is None:
+            raise
+        return None
+    return job
+
+
+@retry_on_locked
+def claim(visibility_timeout):
+    """
+    Забирает самую приоритетную готовую задачу, сдвигая её run_at
+    на visibility_timeout. Сдвиг условный по прежнему run_at, так что
+    одну задачу не заберут два воркера и без блокировок строк.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        failed=False, run_at__lte=now
+    ).order_by('-priority', 'run_at').values_list('pk', 'run_at')
+    for pk, run_at in candidates[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(pk=pk, run_at=run_at).update(
+            run_at=now + timedelta(seconds=visibility_timeout),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def retry_delay(attempt):
+    """Экспонента с джиттером, как у повторов записи в core.db."""
+    delay = min(
+        settings.JOBS_RETRY_BASE_DELAY * 2 ** (attempt - 1),
+        settings.JOBS_RETRY_MAX_DELAY
+    )
+    return random.uniform(delay / 2, delay)
+
+
+@retry_on_locked
+def complete(job):
+    Job.objects.filter(pk=job.pk).delete()
+
+
+@retry_on_locked
+def postpone(job, delay):
+    Job.objects.filter(pk=job.pk).update(
+        run_at=timezone.now() + timedelta(seconds=delay),
+        attempts=F('attempts') - 1
+    )
+    return 'postponed'
+
+
+@retry_on_locked
+def fail(job, error):
+    """Откладывает повтор задачи или, если попытки кончились, хоронит её."""
+    if job.attempts >= job.max_attempts:
+        # Упавшая задача освобождает ключ, чтобы такую же можно было
+        # поставить снова.
+        Job.objects.filter(pk=job.pk).update(
+            failed=True, dedupe_key=None, last_error=error
+        )
+        return 'failed'
+    Job.objects.filter(pk=job.pk).update(
+        run_at=timezone.now() + timedelta(
+            seconds=retry_delay(job.attempts)
+        ),
+        last_error=error
+    )
+    return 'retry'
+
+
+def run_job(job):
+    """Выполняет взятую задачу: успех удаляет её, ошибка — повтор."""
+    started = time.perf_counter()
+    try:
+        resolve(job.name)(**json.loads(job.payload))
+    except Postpone as request:
+        result = postpone(job, request.delay)
+    except Exception:
+        logger.exception('Задача %s #%s упала', job.name, job.pk)
+        result = fail(job, traceback.format_exc())
+    else:
+        complete(job)
+        result = 'done'
+    JOB_SECONDS.observe(time.perf_counter() - started, name=job.name)
+    JOBS.inc(name=job.name, result=result)
+    metrics.flush()
+    return result
+
+
+def work(stop, poll_interval, visibility_timeout, burst=False):
+    """
+    Цикл одного воркера: берёт и выполняет задачи, пока не выставлен
+    stop. С burst выходит, как только готовых задач не осталось.
+    """
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim(visibility_timeout)
+            if job is None:
+                if burst:
+                    return
+                stop.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connection.close()
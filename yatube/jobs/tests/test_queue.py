@@ -0,0 +1,136 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ..models import Job
+from ..queue import Postpone, claim, enqueue, run_job, task, work
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def explode():
+    raise RuntimeError('сломалось')
+
+
+@task
+def wait(delay):
+    raise Postpone(delay)
+
+
+def not_a_task():
+    pass
+
+
+class QueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_requires_registered_task(self):
+        """В очередь ставятся только функции с @task"""
+        with self.assertRaises(ValueError):
+            enqueue(not_a_task)
+
+    def test_job_runs_and_is_deleted(self):
+        """Выполненная задача удаляется из очереди"""
+        enqueue(record, {'value': 1})
+        job = claim(60)
+        self.assertEqual(run_job(job), 'done')
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_dedupe_key_skips_duplicates(self):
+        """Вторая задача с тем же ключом не ставится"""
+        self.assertIsNotNone(enqueue(record, {'value': 1}, dedupe_key='k'))
+        self.assertIsNone(enqueue(record, {'value': 2}, dedupe_key='k'))
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_higher_priority_runs_first(self):
+        """Задачи берутся по убыванию приоритета"""
+        enqueue(record, {'value': 'low'})
+        enqueue(record, {'value': 'high'}, priority=10)
+        while True:
+            job = claim(60)
+            if job is None:
+                break
+            run_job(job)
+        self.assertEqual(calls, ['high', 'low'])
+
+    def test_delayed_job_waits(self):
+        """Отложенная задача не берётся раньше срока"""
+        enqueue(record, {'value': 1}, delay=60)
+        self.assertIsNone(claim(60))
+
+    def test_claimed_job_is_hidden_until_timeout(self):
+        """Взятая задача невидима другим воркерам до таймаута"""
+        enqueue(record, {'value': 1})
+        job = claim(60)
+        self.assertIsNone(claim(60))
+        # Воркер умер, таймаут видимости истёк.
+        Job.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        again = claim(60)
+        self.assertEqual(again.pk, job.pk)
+        self.assertEqual(again.attempts, 2)
+
+    @override_settings(JOBS_RETRY_BASE_DELAY=10)
+    def test_failed_job_is_retried_with_backoff(self):
+        """Упавшая задача откладывается и помечается после всех попыток"""
+        enqueue(explode, max_attempts=2, dedupe_key='explode')
+        started = timezone.now()
+        with mock.patch('jobs.queue.logger'):
+            self.assertEqual(run_job(claim(60)), 'retry')
+        job = Job.objects.get()
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=5))
+        self.assertIn('сломалось', job.last_error)
+        Job.objects.update(run_at=timezone.now())
+        with mock.patch('jobs.queue.logger'):
+            self.assertEqual(run_job(claim(60)), 'failed')
+        job = Job.objects.get()
+        self.assertTrue(job.failed)
+        self.assertIsNone(job.dedupe_key)
+        self.assertIsNone(claim(60))
+
+    def test_postponed_job_keeps_attempts_and_key(self):
+        """Задача, отложившая себя, ждёт без траты попыток"""
+        enqueue(wait, {'delay': 60}, max_attempts=1, dedupe_key='wait')
+        started = timezone.now()
+        self.assertEqual(run_job(claim(60)), 'postponed')
+        job = Job.objects.get()
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=60))
+        self.assertEqual(job.attempts, 0)
+        self.assertFalse(job.failed)
+        self.assertEqual(job.last_error, '')
+        self.assertIsNone(enqueue(wait, {'delay': 60}, dedupe_key='wait'))
+        self.assertIsNone(claim(60))
+
+
+class WorkersTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_run_workers_drains_queue(self):
+        """run_workers --burst выполняет все готовые задачи"""
+        for value in range(10):
+            enqueue(record, {'value': value})
+        call_command('run_workers', threads=3, burst=True, stdout=StringIO())
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertFalse(Job.objects.exists())
+
+    def test_worker_stops_on_request(self):
+        """Воркер выходит, когда выставлен stop"""
+        stop = threading.Event()
+        thread = threading.Thread(target=work, args=(stop, 0.01, 60))
+        thread.start()
+        stop.set()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Group, Post
+from .search import matching_ids
 
 
 @admin.register(Post)
@@ -17,6 +18,14 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        ids = matching_ids(search_term)
+        if ids is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=ids), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from django.conf import settings
+        from PIL import Image
+
+        from . import signals  # noqa: F401
+
+        # Pillow отказывается открывать картинки вдвое больше лимита
+        # и предупреждает о тех, что больше него.
+        Image.MAX_IMAGE_PIXELS = settings.POST_IMAGE_MAX_PIXELS
@@ -0,0 +1,184 @@
+import math
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+from core.cache import relocated_caches
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Comment, FeedEntry, Follow, Group, Post, User, UserStats
+
+Scenario = namedtuple(
+    'Scenario', ['name', 'method', 'url', 'user', 'data', 'status']
+)
+# Что холодный прогон сбрасывает перед каждым запросом: все эти слои
+# живут в кеше default.
+CACHE_LAYERS = ('страницы', 'карточки постов', 'kvstore миниатюр')
+
+
+def busiest_group():
+    row = Post.objects.filter(group__isnull=False).values('group').annotate(
+        total=Count('pk')
+    ).order_by('-total').first()
+    return Group.objects.get(pk=row['group']) if row else None
+
+
+def top_user(field):
+    stats = UserStats.objects.select_related('user').order_by(
+        f'-{field}'
+    ).first()
+    return stats.user if stats else None
+
+
+def build_scenarios():
+    """
+    Сценарии по самым тяжёлым объектам выборки: группа с наибольшим
+    числом постов, самый популярный автор, самый обсуждаемый пост
+    и читатель с наибольшим числом подписок.
+    """
+    post = Post.objects.order_by('-comment_count', '-pk').first()
+    group = busiest_group()
+    author = top_user('follower_count')
+    reader = top_user('following_count')
+    if None in (post, group, author, reader):
+        return []
+    return [
+        Scenario('index', 'get', reverse('posts:index'), None, None, 200),
+        Scenario(
+            'group_posts', 'get',
+            reverse('posts:group_list', args=[group.slug]), None, None, 200
+        ),
+        Scenario(
+            'profile', 'get',
+            reverse('posts:profile', args=[author.username]), None, None, 200
+        ),
+        Scenario(
+            'post_detail', 'get',
+            reverse('posts:post_detail', args=[post.pk]), None, None, 200
+        ),
+        Scenario(
+            'follow_index', 'get', reverse('posts:follow_index'),
+            reader, None, 200
+        ),
+        Scenario(
+            'post_create', 'post', reverse('posts:post_create'),
+            author, {'text': 'Пост из бенчмарка'}, 302
+        ),
+        Scenario(
+            'add_comment', 'post',
+            reverse('posts:add_comment', args=[post.pk]),
+            reader, {'text': 'Комментарий из бенчмарка'}, 302
+        ),
+    ]
+
+
+def dataset_size():
+    return {
+        model._meta.model_name: model.objects.count()
+        for model in (User, Group, Post, Comment, Follow, FeedEntry)
+    }
+
+
+def percentile(values, share):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+@contextmanager
+def isolated_cache():
+    """
+    Свой пустой кеш на время замеров: очистка в холодном прогоне
+    не сбрасывает страницы запущенного сервера.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube_benchmark_')
+    try:
+        with override_settings(CACHES=relocated_caches(directory)):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def rolled_back():
+    """Запись в бенчмарке не меняет данные между итерациями."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def call(client, scenario, warm_cache):
+    if not warm_cache:
+        cache.clear()
+    with rolled_back():
+        started = time.perf_counter()
+        response = getattr(client, scenario.method)(
+            scenario.url, scenario.data
+        )
+        elapsed = time.perf_counter() - started
+    if response.status_code != scenario.status:
+        raise RuntimeError(
+            f'{scenario.name}: ответ {response.status_code}, '
+            f'ожидался {scenario.status}'
+        )
+    return elapsed
+
+
+def run_scenario(scenario, iterations, warmup, warm_cache=False):
+    """
+    Замеряет задержку сценария, а затем отдельным прогоном число
+    SQL-запросов и пик памяти: tracemalloc заметно замедляет код,
+    поэтому в замеры времени он не попадает.
+    """
+    client = Client()
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+    for _ in range(warmup):
+        call(client, scenario, warm_cache)
+    timings = [
+        call(client, scenario, warm_cache) for _ in range(iterations)
+    ]
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            call(client, scenario, warm_cache)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare_reports(baseline, current, threshold):
+    """
+    Сравнивает два отчёта. Регрессией считается рост p95 больше чем
+    на threshold процентов или рост числа запросов.
+    """
+    rows = []
+    regressions = []
+    for name, result in current['views'].items():
+        before = baseline['views'].get(name)
+        if before is None:
+            rows.append((name, result, None, None))
+            continue
+        change = (
+            (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            if before['p95_ms'] else 0.0
+        )
+        rows.append((name, result, before, change))
+        if change > threshold or result['queries'] > before['queries']:
+            regressions.append(name)
+    return rows, regressions
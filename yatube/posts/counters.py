@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, UserStats
+
+
+def count_by(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(total=Count('pk')).order_by()
+    )
+
+
+def rebuild_user_stats(user_ids):
+    """Пересчитывает UserStats для пачки пользователей."""
+    posts = count_by(Post.objects.filter(author_id__in=user_ids), 'author')
+    followers = count_by(
+        Follow.objects.filter(author_id__in=user_ids), 'author'
+    )
+    following = count_by(Follow.objects.filter(user_id__in=user_ids), 'user')
+    with transaction.atomic():
+        UserStats.objects.filter(user_id__in=user_ids).delete()
+        UserStats.objects.bulk_create(
+            UserStats(
+                user_id=user_id,
+                post_count=posts.get(user_id, 0),
+                follower_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0)
+            )
+            for user_id in user_ids
+        )
+
+
+def rebuild_comment_counts(post_ids):
+    """Пересчитывает Post.comment_count для пачки постов."""
+    comments = count_by(Comment.objects.filter(post_id__in=post_ids), 'post')
+    now = timezone.now()
+    Post.objects.bulk_update(
+        [
+            Post(
+                id=post_id,
+                comment_count=comments.get(post_id, 0),
+                updated_at=now
+            )
+            for post_id in post_ids
+        ],
+        ['comment_count', 'updated_at']
+    )
+
+
+def update_user_stats(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на deltas."""
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+    # Строки нет только у пользователей, созданных в обход сигналов.
+    # При удалении пользователя её не создаём, иначе она переживёт его.
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        rebuild_user_stats([user_id])
+
+
+def update_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=Greatest(F('comment_count') + delta, 0),
+        # Не Now(): CURRENT_TIMESTAMP в SQLite с точностью до секунды.
+        updated_at=timezone.now()
+    )
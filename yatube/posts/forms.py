@@ -1,4 +1,10 @@
+from core.uploads import RejectedUpload
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from django.utils.datastructures import MultiValueDict
+from posts.images import UnsupportedImage, prepare_upload
 from posts.models import Comment, Post
 
 
@@ -15,6 +21,38 @@ class PostForm(forms.ModelForm):
         }
         fields = ["text", "group", 'image']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Недописанный файл не картинка: убираем его до проверки поля,
+        # чтобы показать ошибку о размере, а не о формате.
+        self.rejected_image = self.files.get('image')
+        if isinstance(self.rejected_image, RejectedUpload):
+            self.files = MultiValueDict({
+                key: self.files.getlist(key)
+                for key in self.files if key != 'image'
+            })
+        else:
+            self.rejected_image = None
+
+    def clean_image(self):
+        if self.rejected_image is not None:
+            raise forms.ValidationError(
+                f'Картинка больше {filesizeformat(settings.MAX_UPLOAD_SIZE)}.'
+            )
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        # ImageField уже прочитал заголовок, но не раскодировал картинку.
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                f'Слишком большое разрешение картинки: {width}x{height}.'
+            )
+        try:
+            return prepare_upload(image)
+        except UnsupportedImage as error:
+            raise forms.ValidationError(str(error))
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,166 @@
+import base64
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, ImageSequence
+
+# Ширина размытой заглушки: data URI получается в несколько сотен байт,
+# его можно хранить в строке поста и вставлять прямо в HTML.
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 40
+# Эти значения EXIF Orientation поворачивают картинку на 90 градусов.
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+EXIF_ORIENTATION = 0x0112
+# Метаданные, которые не переносятся в перекодированную загрузку:
+# в них бывают координаты съёмки и данные камеры.
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+JPEG_QUALITY = 90
+# Форматы, которые Pillow умеет писать, а браузеры показывать. Всё
+# остальное, что Pillow только читает (SUN, PSD, XPM, PCX…), станет PNG.
+OUTPUT_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+OUTPUT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+# MPO — это JPEG с дополнительными кадрами, его пишут многие камеры.
+FORMAT_ALIASES = {'MPO': 'JPEG'}
+# Режимы, в которых картинку можно сохранить в PNG.
+PNG_MODES = {'1', 'L', 'LA', 'I', 'I;16', 'P', 'RGB', 'RGBA'}
+# Форматы с анимацией и параметры сохранения её кадров: каждый кадр
+# собран целиком, поэтому перед следующим он стирается.
+ANIMATED_FORMATS = {
+    'GIF': {'disposal': 2},
+    'PNG': {'disposal': 1},
+    'WEBP': {},
+}
+DEFAULT_DURATION = 100
+
+
+def image_metadata(file):
+    """
+    Ширина и высота картинки с учётом EXIF-поворота и заглушка
+    (data URI крошечной JPEG) для показа, пока грузится миниатюра.
+    Если файл не картинка, возвращает (None, None, '').
+    """
+    position = file.tell()
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+            # JPEG декодируется сразу в уменьшенном масштабе.
+            image.draft('RGB', (PLACEHOLDER_WIDTH * 4, PLACEHOLDER_WIDTH * 4))
+            small = ImageOps.exif_transpose(image).convert('RGB')
+            small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+            buffer = BytesIO()
+            small.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    except (OSError, Image.DecompressionBombError):
+        return None, None, ''
+    finally:
+        file.seek(position)
+    data = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return width, height, f'data:image/jpeg;base64,{data}'
+
+
+class UnsupportedImage(Exception):
+    """Картинку не удалось перекодировать; текст можно показать в форме."""
+
+
+def resized_frames(image, max_side):
+    """
+    Кадры анимации, уменьшенные до max_side, и их длительности.
+    Pillow отдаёт кадры уже собранными целиком. Палитра кадра
+    меняется на RGB(A), только если его надо уменьшать: так у GIF
+    без нужды не теряется прозрачность.
+    """
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', DEFAULT_DURATION))
+        if max(frame.size) > max_side:
+            frame = frame.convert(
+                'RGBA' if 'transparency' in frame.info else 'RGB'
+            )
+            frame.thumbnail((max_side, max_side))
+        else:
+            frame = frame.copy()
+        frames.append(frame)
+    return frames, durations
+
+
+def output_format(image):
+    format_ = FORMAT_ALIASES.get(image.format, image.format)
+    return format_ if format_ in OUTPUT_FORMATS else 'PNG'
+
+
+def encode(image, format_, max_side):
+    """
+    Уменьшает картинку до max_side и пишет её в format_ без метаданных.
+    Анимации уменьшаются покадрово, у прочих многокадровых файлов
+    (MPO с камер) берётся первый кадр.
+    """
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if format_ == 'JPEG':
+        options['quality'] = JPEG_QUALITY
+    if getattr(image, 'is_animated', False) and format_ in ANIMATED_FORMATS:
+        width, height = image.size
+        if width * height * image.n_frames > settings.POST_IMAGE_MAX_PIXELS:
+            raise UnsupportedImage(
+                f'Слишком длинная анимация: {image.n_frames} кадров '
+                f'{width}x{height}.'
+            )
+        frames, durations = resized_frames(image, max_side)
+        result = frames[0]
+        options.update(
+            ANIMATED_FORMATS[format_],
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=image.info.get('loop', 0)
+        )
+    else:
+        image.draft(image.mode, (max_side, max_side))
+        result = ImageOps.exif_transpose(image)
+        result.thumbnail((max_side, max_side))
+        if format_ == 'PNG' and result.mode not in PNG_MODES:
+            result = result.convert('RGBA')
+    for key in METADATA_KEYS:
+        result.info.pop(key, None)
+    # Безымянный временный файл: удаляется сам при закрытии.
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    result.save(output, format_, **options)
+    return output
+
+
+def prepare_upload(upload):
+    """
+    Перекодирует загруженную картинку за один проход: поворачивает
+    по EXIF, уменьшает до POST_IMAGE_MAX_SIDE и сохраняет без
+    метаданных. JPEG сразу декодируется в уменьшенном масштабе.
+    Формат сохраняется, если Pillow умеет в него писать, а браузеры
+    его показывают, иначе картинка становится PNG. Если перекодировать
+    не удалось, поднимает UnsupportedImage.
+    """
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            source_format = image.format
+            format_ = output_format(image)
+            output = encode(image, format_, settings.POST_IMAGE_MAX_SIDE)
+    except (
+        OSError, KeyError, ValueError, Image.DecompressionBombError
+    ) as error:
+        raise UnsupportedImage(
+            'Не удалось обработать картинку, загрузите JPEG или PNG.'
+        ) from error
+    size = output.tell()
+    output.seek(0)
+    name = upload.name
+    content_type = upload.content_type
+    if format_ != source_format:
+        name = os.path.splitext(name)[0] + OUTPUT_EXTENSIONS[format_]
+        content_type = Image.MIME[format_]
+    return UploadedFile(output, name, content_type, size, upload.charset)
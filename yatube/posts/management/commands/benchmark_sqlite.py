@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import defaultdict
+
+from core.db import retry_on_locked
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import override_settings
+
+from posts.benchmarks import percentile
+from posts.models import Comment, Post, User
+from posts.utils import LIMIT_POST
+
+BENCHMARK_TEXT = 'benchmark_sqlite'
+# Без настроек core.db: журнал DELETE, ожидание блокировки драйвера
+# по умолчанию и ни одного повтора записи.
+BASELINE = {
+    'SQLITE_PRAGMAS': {'journal_mode': 'delete'},
+    'SQLITE_WRITE_ATTEMPTS': 1,
+}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = 0
+
+    def record(self, kind, elapsed):
+        with self.lock:
+            self.timings[kind].append(elapsed)
+
+    def fail(self):
+        with self.lock:
+            self.errors += 1
+
+
+@retry_on_locked
+def write(number, author_id, post_id):
+    # Чередуем две самые частые записи: пост с раскладкой по лентам
+    # подписчиков и комментарий со счётчиком.
+    if number % 2:
+        Post.objects.create(author_id=author_id, text=BENCHMARK_TEXT)
+    else:
+        Comment.objects.create(
+            post_id=post_id, author_id=author_id, text=BENCHMARK_TEXT
+        )
+
+
+def read():
+    list(Post.objects.select_related('author', 'group')[:LIMIT_POST])
+
+
+def worker(kind, stop, stats, author_id, post_id):
+    number = 0
+    try:
+        while not stop.is_set():
+            number += 1
+            started = time.perf_counter()
+            try:
+                if kind == 'write':
+                    write(number, author_id, post_id)
+                else:
+                    read()
+            except OperationalError:
+                stats.fail()
+                continue
+            stats.record(kind, time.perf_counter() - started)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность SQLite при одновременных '
+        'чтениях и записях.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--duration', type=float, default=10.0,
+            help='Длительность замера в секундах.'
+        )
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help='Сначала замерить без настроек core.db для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        post = Post.objects.order_by('-pk').first()
+        author = User.objects.order_by('pk').first()
+        if post is None or author is None:
+            raise CommandError('В базе нет постов, запустите seed_yatube.')
+        phases = [('tuned', {})]
+        if options['baseline']:
+            phases.insert(0, ('baseline', BASELINE))
+        self.stdout.write(
+            f'{"режим":<10}{"чтений/с":>10}{"записей/с":>11}'
+            f'{"ошибок":>8}{"p95 чтения":>12}{"p95 записи":>12}'
+        )
+        try:
+            for name, overrides in phases:
+                # Новые соединения получат PRAGMA этого режима.
+                close_old_connections()
+                connection.close()
+                with override_settings(**overrides):
+                    stats = self.run_phase(options, author.pk, post.pk)
+                self.print_phase(name, stats, options['duration'])
+        finally:
+            connection.close()
+            Post.objects.filter(text=BENCHMARK_TEXT).delete()
+            Comment.objects.filter(text=BENCHMARK_TEXT).delete()
+
+    def run_phase(self, options, author_id, post_id):
+        stats = Stats()
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(kind, stop, stats, author_id, post_id)
+            )
+            for kind, count in (
+                ('read', options['readers']), ('write', options['writers'])
+            )
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        connection.close()
+        return stats
+
+    def print_phase(self, name, stats, duration):
+        reads = stats.timings['read']
+        writes = stats.timings['write']
+
+        def p95(values):
+            return percentile(values, 0.95) * 1000 if values else 0.0
+
+        self.stdout.write(
+            f'{name:<10}{len(reads) / duration:>10.1f}'
+            f'{len(writes) / duration:>11.1f}{stats.errors:>8}'
+            f'{p95(reads):>10.1f}мс{p95(writes):>10.1f}мс'
+        )
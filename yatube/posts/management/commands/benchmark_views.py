@@ -0,0 +1,129 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from posts.benchmarks import (CACHE_LAYERS, build_scenarios, compare_reports,
+                              dataset_size, isolated_cache, run_scenario)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95 задержки, число SQL-запросов и пик памяти '
+        'представлений posts на текущей базе (см. seed_yatube).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help=(
+                'Не очищать кеш перед каждым запросом. Без флага '
+                'холодными будут: ' + ', '.join(CACHE_LAYERS) + '.'
+            )
+        )
+        parser.add_argument(
+            '--only', action='append', default=[],
+            help='Замерить только указанные представления.'
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+        parser.add_argument(
+            '--compare', help='JSON-отчёт, с которым сравнить результат.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=10.0,
+            help='Допустимый рост p95 в процентах.'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужна хотя бы одна итерация.')
+        scenarios = build_scenarios()
+        if not scenarios:
+            raise CommandError(
+                'В базе нет данных для замеров, запустите seed_yatube.'
+            )
+        if options['only']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options['only']
+            ]
+        report = {
+            'created': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': options['iterations'],
+            'warm_cache': options['warm_cache'],
+            'cold_layers': [] if options['warm_cache'] else list(
+                CACHE_LAYERS
+            ),
+            'dataset': dataset_size(),
+            'views': {},
+        }
+        with override_settings(ALLOWED_HOSTS=['testserver']), \
+                isolated_cache():
+            for scenario in scenarios:
+                report['views'][scenario.name] = run_scenario(
+                    scenario,
+                    options['iterations'],
+                    options['warmup'],
+                    options['warm_cache']
+                )
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            self.print_comparison(baseline, report, options['threshold'])
+
+    def print_report(self, report):
+        if report['cold_layers']:
+            self.stdout.write(
+                'Холодный кеш перед каждым запросом: '
+                + ', '.join(report['cold_layers'])
+            )
+        else:
+            self.stdout.write('Тёплый кеш')
+        self.stdout.write(
+            f'{"view":<14}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"запросов":>10}{"память, КБ":>12}'
+        )
+        for name, result in report['views'].items():
+            self.stdout.write(
+                f'{name:<14}{result["p50_ms"]:>10.2f}'
+                f'{result["p95_ms"]:>10.2f}{result["queries"]:>10}'
+                f'{result["peak_kb"]:>12.1f}'
+            )
+
+    def print_comparison(self, baseline, report, threshold):
+        rows, regressions = compare_reports(baseline, report, threshold)
+        self.stdout.write(f'Сравнение с {baseline.get("revision")}:')
+        for name, result, before, change in rows:
+            if before is None:
+                self.stdout.write(f'{name:<14}нет в базовом отчёте')
+                continue
+            self.stdout.write(
+                f'{name:<14}p95 {before["p95_ms"]:.2f} -> '
+                f'{result["p95_ms"]:.2f} мс ({change:+.1f}%), '
+                f'запросов {before["queries"]} -> {result["queries"]}'
+            )
+        if regressions:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}')
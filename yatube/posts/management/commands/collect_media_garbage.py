@@ -0,0 +1,197 @@
+import posixpath
+import time
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts.models import Post
+from posts.thumbnails import delete_if_unused
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def walk(storage, path):
+    """Файлы каталога хранилища: listdir по одному каталогу за раз."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, миниатюры и записи kvstore sorl, '
+        'на которые ничто не ссылается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause', type=float, default=0.5,
+            help='Пауза после каждой пачки удалений, в секундах.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help=(
+                'Не трогать файлы моложе стольких секунд: пост с ними '
+                'может быть ещё не сохранён.'
+            )
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удаляя.'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        self.min_age = options['min_age']
+        self.cutoff = timezone.now() - timedelta(seconds=self.min_age)
+        # Сначала исходники: sorl удаляет их вместе с миниатюрами
+        # и записями kvstore, остальное подбирают следующие проходы.
+        totals = [
+            ('картинок', self.collect_originals()),
+            ('миниатюр', self.collect_thumbnails()),
+            ('записей kvstore', self.collect_kvstore()),
+        ]
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(f'{verb} ' + ', '.join(
+            f'{label}: {count}' for label, count in totals
+        ))
+
+    def old_files(self, storage, path):
+        for name in walk(storage, path):
+            if storage.get_modified_time(name) < self.cutoff:
+                yield name
+
+    def delete(self, items, delete):
+        """Удаляет пачку и делает паузу, чтобы не забивать диск и базу."""
+        if not items:
+            return 0
+        for item in items:
+            if self.verbosity > 1:
+                self.stdout.write(str(item))
+            if not self.dry_run:
+                delete(item)
+        if not self.dry_run:
+            time.sleep(self.pause)
+        return len(items)
+
+    def collect_originals(self):
+        field = Post._meta.get_field('image')
+        directory = field.upload_to.rstrip('/')
+        deleted = 0
+        for names in batched(
+            self.old_files(field.storage, directory), self.batch_size
+        ):
+            used = set(
+                Post.objects.filter(image__in=names).values_list(
+                    'image', flat=True
+                )
+            )
+            deleted += self.delete(
+                [name for name in names if name not in used],
+                partial(delete_if_unused, min_age=self.min_age)
+            )
+        return deleted
+
+    def collect_thumbnails(self):
+        """Файлы миниатюр, о которых kvstore ничего не знает."""
+        storage = default.storage
+        directory = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        deleted = 0
+        for names in batched(
+            self.old_files(storage, directory), self.batch_size
+        ):
+            keys = {
+                add_prefix(ImageFile(name, storage).key): name
+                for name in names
+            }
+            known = set(
+                KVStore.objects.filter(key__in=keys).values_list(
+                    'key', flat=True
+                )
+            )
+            deleted += self.delete(
+                [name for key, name in keys.items() if key not in known],
+                storage.delete
+            )
+        return deleted
+
+    def iter_kvstore(self, identity):
+        """Записи kvstore пачками по возрастанию ключа, без OFFSET."""
+        prefix = add_prefix('', identity)
+        last_key = ''
+        while True:
+            rows = list(
+                KVStore.objects.filter(
+                    key__startswith=prefix, key__gt=last_key
+                ).order_by('key').values_list('key', 'value')[
+                    :self.batch_size
+                ]
+            )
+            if not rows:
+                return
+            yield rows
+            last_key = rows[-1][0]
+
+    def collect_kvstore(self):
+        kvstore = default.kvstore
+        thumbnail_prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        deleted = 0
+        for rows in self.iter_kvstore('image'):
+            images = [deserialize_image_file(value) for key, value in rows]
+            sources = [
+                image.name for image in images
+                if not image.name.startswith(thumbnail_prefix)
+            ]
+            used = set(
+                Post.objects.filter(image__in=sources).values_list(
+                    'image', flat=True
+                )
+            )
+            stale = [
+                image for image in images
+                if not image.exists() or (
+                    not image.name.startswith(thumbnail_prefix)
+                    and image.name not in used
+                )
+            ]
+            # kvstore.delete убирает и миниатюры исходника.
+            deleted += self.delete(stale, kvstore.delete)
+        # Списки миниатюр исходников, которых в kvstore уже нет.
+        for rows in self.iter_kvstore('thumbnails'):
+            keys = {
+                add_prefix(del_prefix(key)): key for key, value in rows
+            }
+            known = set(
+                KVStore.objects.filter(key__in=keys).values_list(
+                    'key', flat=True
+                )
+            )
+            deleted += self.delete(
+                [key for image_key, key in keys.items()
+                 if image_key not in known],
+                kvstore._delete_raw
+            )
+        return deleted
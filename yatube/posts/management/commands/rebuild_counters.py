@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_comment_counts, rebuild_user_stats
+from posts.models import Post, User
+from posts.utils import iter_id_batches
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = 0
+        for user_ids in iter_id_batches(User.objects.all(), batch_size):
+            rebuild_user_stats(user_ids)
+            users += len(user_ids)
+        posts = 0
+        for post_ids in iter_id_batches(Post.objects.all(), batch_size):
+            rebuild_comment_counts(post_ids)
+            posts += len(post_ids)
+        self.stdout.write(
+            f'Пересчитано пользователей: {users}, постов: {posts}'
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import IMAGE_FIELDS, Post
+from posts.utils import iter_id_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает размеры и заглушки картинок постов, загруженных '
+        'до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.exclude(image='').filter(
+            image_width__isnull=True
+        )
+        total = missing = 0
+        for post_ids in iter_id_batches(queryset, options['batch_size']):
+            posts = list(Post.objects.filter(pk__in=post_ids).only('image'))
+            for post in posts:
+                try:
+                    with post.image.open('rb'):
+                        post.read_image_metadata()
+                except FileNotFoundError:
+                    missing += 1
+            Post.objects.bulk_update(posts, IMAGE_FIELDS)
+            total += len(posts)
+        self.stdout.write(
+            f'Обработано постов: {total}, файлов не найдено: {missing}'
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import RENDERED_FIELDS, Post
+from posts.utils import iter_id_batches
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает HTML текста и превью постов пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Только посты, у которых HTML ещё не посчитан.'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        if options['missing']:
+            queryset = queryset.filter(text_html='')
+        total = 0
+        for post_ids in iter_id_batches(queryset, options['batch_size']):
+            posts = list(Post.objects.filter(pk__in=post_ids).only('text'))
+            now = timezone.now()
+            for post in posts:
+                post.render_text()
+                post.updated_at = now
+            Post.objects.bulk_update(posts, RENDERED_FIELDS + ['updated_at'])
+            total += len(posts)
+        self.stdout.write(f'Обработано постов: {total}')
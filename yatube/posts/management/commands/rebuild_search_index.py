@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import (clear_search_index, ensure_search_index,
+                          index_posts, search_supported)
+from posts.utils import iter_id_batches
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            raise CommandError('Полнотекстовый поиск требует SQLite с FTS5.')
+        ensure_search_index()
+        clear_search_index()
+        posts = 0
+        # Каждая пачка в своей транзакции: запись в SQLite не блокируется
+        # на всё время перестройки.
+        for post_ids in iter_id_batches(
+            Post.objects.all(), options['batch_size']
+        ):
+            with transaction.atomic():
+                index_posts(post_ids)
+            posts += len(post_ids)
+        self.stdout.write(f'Проиндексировано постов: {posts}')
@@ -0,0 +1,314 @@
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from core.cache import bump_generation
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts.counters import rebuild_comment_counts, rebuild_user_stats
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+from posts.signals import FEED_BACKFILL_LIMIT
+from posts.utils import iter_id_batches
+
+# Тексты постов и комментариев собираются из готовых предложений:
+# генерировать каждое через Faker на миллионах строк слишком долго.
+SENTENCE_POOL = 2000
+TIMELINE_DAYS = 365
+MAX_BURST = 30
+# Средний интервал между постами одной серии, в секундах.
+BURST_INTERVAL = 10 * 60
+GROUP_SHARE = 0.6
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def power_law_choice(rng, population):
+    """Элемент population с вероятностью ~1/ранг (закон Ципфа)."""
+    return population[int(len(population) ** rng.random()) - 1]
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Даёт bulk_create записать заданные даты вместо auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def new_ids(queryset, last_pk):
+    return array('q', queryset.filter(pk__gt=last_pk).order_by(
+        'pk'
+    ).values_list('pk', flat=True).iterator())
+
+
+def last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочного тестирования.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок у пользователя.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Зерно генератора: с ним данные воспроизводятся.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--password', default='yatube')
+        parser.add_argument(
+            '--no-feeds', action='store_true',
+            help='Не заполнять ленты подписок.'
+        )
+
+    def handle(self, *args, **options):
+        seed = options['seed']
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.rng = random.Random(seed)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.fake = fake
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.sentences = [
+            fake.sentence(nb_words=self.rng.randint(4, 14))
+            for _ in range(SENTENCE_POOL)
+        ]
+        self.stdout.write(f'Зерно: {seed}')
+
+        user_ids = self.create_users(options['users'], options['password'])
+        if not user_ids:
+            return
+        group_ids = self.create_groups(options['groups'])
+        # Два независимых порядка по закону Ципфа: кто чаще пишет и на
+        # кого чаще подписываются. Если их совместить, самые плодовитые
+        # авторы получат и всех подписчиков, и ленты раздуются.
+        activity = array('q', user_ids)
+        self.rng.shuffle(activity)
+        popularity = array('q', user_ids)
+        self.rng.shuffle(popularity)
+        first_post = last_pk(Post) + 1
+        self.create_posts(options['posts'], activity, group_ids)
+        self.create_follows(options['follows'], user_ids, popularity)
+        self.create_comments(options['comments'], user_ids, first_post)
+        if not options['no_feeds']:
+            self.fill_feeds(user_ids)
+        self.rebuild_counters(first_post)
+        bump_generation()
+
+    def insert(self, model, objects, label):
+        # ignore_conflicts молча пропускает дубликаты, а bulk_create
+        # не говорит сколько, поэтому считаем строки до и после.
+        before = model.objects.count()
+        for chunk in chunked(objects, self.batch_size):
+            model.objects.bulk_create(chunk, ignore_conflicts=True)
+        self.stdout.write(f'{label}: {model.objects.count() - before}')
+
+    def text(self, low, high):
+        return ' '.join(
+            self.rng.choice(self.sentences)
+            for _ in range(self.rng.randint(low, high))
+        )
+
+    def create_users(self, count, password):
+        start = last_pk(User)
+        password = make_password(password)
+        fake = self.fake
+        self.insert(
+            User,
+            (
+                User(
+                    username=f'{fake.user_name()}.{start + index}',
+                    first_name=fake.first_name(),
+                    last_name=fake.last_name(),
+                    password=password
+                )
+                for index in range(1, count + 1)
+            ),
+            'Пользователей'
+        )
+        return new_ids(User.objects.all(), start)
+
+    def create_groups(self, count):
+        start = last_pk(Group)
+        self.insert(
+            Group,
+            (
+                Group(
+                    title=f'{self.fake.word().capitalize()} {start + index}',
+                    slug=f'seed-{start + index}',
+                    description=self.text(1, 3)
+                )
+                for index in range(1, count + 1)
+            ),
+            'Групп'
+        )
+        return new_ids(Group.objects.all(), start)
+
+    def generate_posts(self, count, activity, group_ids):
+        rng = self.rng
+        start = self.now - timedelta(days=TIMELINE_DAYS)
+        produced = 0
+        while produced < count:
+            # Автор пишет сериями: несколько постов подряд с короткими
+            # интервалами, длина серии распределена по Парето.
+            author_id = power_law_choice(rng, activity)
+            burst = min(int(rng.paretovariate(1.2)), MAX_BURST)
+            burst = min(burst, count - produced)
+            moment = start + timedelta(
+                seconds=rng.random() * TIMELINE_DAYS * 24 * 60 * 60
+            )
+            group_id = None
+            if group_ids and rng.random() < GROUP_SHARE:
+                group_id = power_law_choice(rng, group_ids)
+            for _ in range(burst):
+                moment += timedelta(
+                    seconds=rng.expovariate(1 / BURST_INTERVAL)
+                )
+                post = Post(
+                    author_id=author_id,
+                    group_id=group_id,
+                    text=self.text(1, 8),
+                    pub_date=min(moment, self.now)
+                )
+                post.render_text()
+                yield post
+            produced += burst
+
+    def create_posts(self, count, activity, group_ids):
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.insert(
+                Post,
+                self.generate_posts(count, activity, group_ids),
+                'Постов'
+            )
+
+    def generate_follows(self, mean, user_ids, popularity):
+        rng = self.rng
+        limit = len(user_ids) - 1
+        for user_id in user_ids:
+            wanted = min(int(rng.expovariate(1 / mean)), limit) if mean else 0
+            authors = set()
+            # Подписываются в основном на популярных авторов, поэтому
+            # число подписчиков подчиняется степенному закону.
+            for _ in range(wanted * 3):
+                if len(authors) == wanted:
+                    break
+                author_id = power_law_choice(rng, popularity)
+                if author_id != user_id:
+                    authors.add(author_id)
+            for author_id in sorted(authors):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def create_follows(self, mean, user_ids, popularity):
+        self.insert(
+            Follow,
+            self.generate_follows(mean, user_ids, popularity),
+            'Подписок'
+        )
+
+    def generate_comments(self, count, user_ids, first_post):
+        rng = self.rng
+        posts = Post.objects.filter(pk__gte=first_post)
+        total = posts.count()
+        if not total:
+            return
+        # У paretovariate(1.5) среднее 3: делим, чтобы сохранить среднее
+        # число комментариев на пост, а обсуждения остались неравными.
+        scale = count / total / 3
+        produced = 0
+        for post_ids in iter_id_batches(posts, self.batch_size):
+            rows = Post.objects.filter(pk__in=post_ids).values_list(
+                'pk', 'pub_date'
+            )
+            for post_id, pub_date in rows:
+                # Случайное округление не занижает среднее, как int().
+                wanted = int(scale * rng.paretovariate(1.5) + rng.random())
+                for _ in range(min(wanted, count - produced)):
+                    created = pub_date + timedelta(
+                        seconds=rng.expovariate(1 / (6 * 60 * 60))
+                    )
+                    yield Comment(
+                        post_id=post_id,
+                        author_id=rng.choice(user_ids),
+                        text=self.text(1, 3),
+                        created=min(created, self.now)
+                    )
+                    produced += 1
+                if produced >= count:
+                    return
+
+    def create_comments(self, count, user_ids, first_post):
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(
+                Comment,
+                self.generate_comments(count, user_ids, first_post),
+                'Комментариев'
+            )
+
+    def fill_feeds(self, user_ids):
+        """
+        Заполняет ленты одним INSERT ... SELECT на пачку подписчиков:
+        bulk_create не вызывает сигналы, которые делают это для постов
+        из приложения. Как и при подписке, от каждого автора берутся
+        только FEED_BACKFILL_LIMIT последних постов.
+        """
+        feed = FeedEntry._meta.db_table
+        follow = Follow._meta.db_table
+        post = Post._meta.db_table
+        total = 0
+        for chunk in chunked(user_ids, self.batch_size):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT OR IGNORE INTO {feed} '
+                    '(user_id, post_id, author_id, pub_date) '
+                    'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+                    f'FROM {follow} f JOIN {post} p '
+                    'ON p.author_id = f.author_id '
+                    f'WHERE f.user_id IN ({placeholders}) '
+                    f'AND p.id IN (SELECT id FROM {post} '
+                    'WHERE author_id = f.author_id '
+                    'ORDER BY pub_date DESC, id DESC LIMIT %s)',
+                    [*chunk, FEED_BACKFILL_LIMIT]
+                )
+                total += cursor.rowcount
+        self.stdout.write(f'Записей в лентах: {total}')
+
+    def rebuild_counters(self, first_post):
+        for user_ids in iter_id_batches(User.objects.all(), self.batch_size):
+            rebuild_user_stats(user_ids)
+        for post_ids in iter_id_batches(
+            Post.objects.filter(pk__gte=first_post), self.batch_size
+        ):
+            rebuild_comment_counts(post_ids)
+        self.stdout.write('Счётчики пересчитаны')
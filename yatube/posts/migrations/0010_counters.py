@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-18 00:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def count_by(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(total=Count('pk')).order_by()
+    )
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    posts = count_by(Post.objects.all(), 'author')
+    followers = count_by(Follow.objects.all(), 'author')
+    following = count_by(Follow.objects.all(), 'user')
+    UserStats.objects.bulk_create(
+        (
+            UserStats(
+                user_id=user_id,
+                post_count=posts.get(user_id, 0),
+                follower_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0)
+            )
+            for user_id in User.objects.values_list('pk', flat=True)
+        ),
+        batch_size=500
+    )
+    for post_id, total in count_by(Comment.objects.all(), 'post').items():
+        Post.objects.filter(pk=post_id).update(comment_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('follower_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
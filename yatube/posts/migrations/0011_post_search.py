@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:40
+
+from django.db import migrations
+
+TABLE = 'posts_post_fts'
+
+FORWARD = [
+    f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f'CREATE TRIGGER {TABLE}_insert AFTER INSERT ON posts_post BEGIN '
+    f'INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END',
+    f'CREATE TRIGGER {TABLE}_delete AFTER DELETE ON posts_post BEGIN '
+    f'INSERT INTO {TABLE}({TABLE}, rowid, text) '
+    "VALUES ('delete', old.id, old.text); END",
+    f'CREATE TRIGGER {TABLE}_update AFTER UPDATE OF text ON posts_post BEGIN '
+    f'INSERT INTO {TABLE}({TABLE}, rowid, text) '
+    "VALUES ('delete', old.id, old.text); "
+    f'INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END',
+    f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')",
+]
+
+BACKWARD = [
+    f'DROP TRIGGER IF EXISTS {TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {TABLE}_update',
+    f'DROP TABLE IF EXISTS {TABLE}',
+]
+
+
+def fts5_available(connection):
+    # Полнотекстовый индекс есть только у SQLite, собранного с FTS5.
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if not fts5_available(schema_editor.connection):
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 00:42
+
+from django.db import migrations, models
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+PREVIEW_LENGTH = 500
+BATCH_SIZE = 1000
+
+
+def backfill_previews(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    last_id = 0
+    while True:
+        posts = list(
+            Post.objects.filter(pk__gt=last_id).order_by('pk').only(
+                'pk', 'text'
+            )[:BATCH_SIZE]
+        )
+        if not posts:
+            return
+        for post in posts:
+            preview = Truncator(post.text).chars(PREVIEW_LENGTH)
+            post.preview = linebreaksbr(preview, autoescape=True)
+            post.preview_truncated = preview != post.text
+        Post.objects.bulk_update(posts, ['preview', 'preview_truncated'])
+        last_id = posts[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='preview',
+            field=models.TextField(default='', editable=False, verbose_name='Превью'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='preview_truncated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Превью обрезано'),
+        ),
+        migrations.RunPython(backfill_previews, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,27 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+from .images import image_metadata
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
+# Столько символов текста показывают карточки в списках постов.
+PREVIEW_LENGTH = 500
+# Поля, которые Post.render_text вычисляет из текста.
+RENDERED_FIELDS = ['text_html', 'preview', 'preview_truncated']
+# Поля, которые Post.read_image_metadata вычисляет из загруженной картинки.
+IMAGE_FIELDS = ['image_width', 'image_height', 'image_placeholder']
+# Спискам постов хватает превью, полный текст нужен только post_detail.
+LISTING_DEFERRED_FIELDS = ['text', 'text_html']
+
+
+def render_html(text):
+    """Текст поста, экранированный и с <br> вместо переносов строк."""
+    return linebreaksbr(text, autoescape=True)
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -31,15 +50,106 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False,
+        help_text='data URI размытой копии картинки'
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+    text_html = models.TextField(
+        'HTML текста',
+        default='',
+        editable=False
+    )
+    preview = models.TextField(
+        'Превью',
+        default='',
+        editable=False
+    )
+    preview_truncated = models.BooleanField(
+        'Превью обрезано',
+        default=False,
+        editable=False
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+            # Сколько постов ссылается на файл картинки.
+            models.Index(fields=['image']),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Любая правка меняет версию поста, по ней ключуются карточки.
+            update_fields = {*update_fields, 'updated_at'}
+            kwargs['update_fields'] = update_fields
+        if update_fields is None or 'text' in update_fields:
+            self.render_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        if update_fields is None or 'image' in update_fields:
+            # Новая загрузка ещё не сохранена в хранилище (_committed),
+            # уже сохранённые картинки повторно не открываем.
+            if not self.image or not self.image._committed:
+                self.read_image_metadata()
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], *IMAGE_FIELDS
+                }
+        super().save(*args, **kwargs)
+
+    def read_image_metadata(self):
+        """Размеры и заглушка картинки, чтобы шаблоны не открывали файл."""
+        if not self.image:
+            self.image_width = self.image_height = None
+            self.image_placeholder = ''
+            return
+        (
+            self.image_width, self.image_height, self.image_placeholder
+        ) = image_metadata(self.image)
+
+    def render_text(self):
+        """
+        Пересчитывает HTML текста и превью, чтобы шаблоны не форматировали
+        текст на каждой отрисовке. bulk_create его сам не вызывает.
+        """
+        self.text_html = render_html(self.text)
+        preview = Truncator(self.text).chars(PREVIEW_LENGTH)
+        self.preview = render_html(preview)
+        self.preview_truncated = preview != self.text
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -73,6 +183,9 @@ class Comment(models.Model):
 
     class Meta:
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created']),
+        ]
 
 
 class Follow(models.Model):
@@ -88,3 +201,62 @@ class Follow(models.Model):
         verbose_name='Автор',
         on_delete=models.CASCADE
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='feed_entries',
+        verbose_name='Пост',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        verbose_name='Автор',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-id']),
+            models.Index(fields=['user', 'author']),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляются сигналами posts.signals."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE
+    )
+    post_count = models.PositiveIntegerField('Постов', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
@@ -0,0 +1,216 @@
+import re
+import sqlite3
+from contextlib import closing
+from functools import lru_cache
+
+from django.core import signing
+from django.db import OperationalError, connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .utils import LIMIT_POST
+
+SEARCH_TABLE = 'posts_post_fts'
+SEARCH_SALT = 'posts.search'
+# Ограничение на число слов в запросе, чтобы не строить огромный MATCH.
+MAX_TERMS = 10
+SNIPPET_TOKENS = 24
+# Управляющие символы вместо <mark>: текст поста экранируется целиком,
+# а метки подсвеченных слов подменяются уже после экранирования.
+MARK_START = '\x02'
+MARK_END = '\x03'
+TERM_RE = re.compile(r'\w+')
+
+CREATE_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+# Триггеры, а не сигналы: индекс видит и bulk_create, и update().
+TRIGGERS = {
+    f'{SEARCH_TABLE}_insert': (
+        f'CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert '
+        'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {SEARCH_TABLE}(rowid, text) '
+        'VALUES (new.id, new.text); END'
+    ),
+    f'{SEARCH_TABLE}_delete': (
+        f'CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete '
+        'AFTER DELETE ON posts_post BEGIN '
+        f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); END"
+    ),
+    f'{SEARCH_TABLE}_update': (
+        f'CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update '
+        'AFTER UPDATE OF text ON posts_post BEGIN '
+        f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {SEARCH_TABLE}(rowid, text) '
+        'VALUES (new.id, new.text); END'
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def fts5_compiled():
+    """Собрана ли библиотека SQLite с FTS5: она одна на весь процесс."""
+    with closing(sqlite3.connect(':memory:')) as db:
+        options = {row[0] for row in db.execute('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+def search_supported(using=connection):
+    return using.vendor == 'sqlite' and fts5_compiled()
+
+
+def search_available(using=connection):
+    """
+    Есть ли поисковая таблица: её нет после отката миграции. Смотрит
+    схему базы, поэтому только для редких вызовов, как поиск в админке.
+    """
+    return (
+        search_supported(using)
+        and SEARCH_TABLE in using.introspection.table_names()
+    )
+
+
+def ensure_search_index(using=connection):
+    """
+    Создаёт поисковую таблицу и триггеры, если их нет. SQLite теряет
+    триггеры, когда миграция пересоздаёт posts_post, поэтому после
+    их восстановления индекс перестраивается.
+    """
+    if not search_supported(using):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            'AND tbl_name = %s',
+            ['posts_post']
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return False
+        with transaction.atomic(using=using.alias):
+            cursor.execute(CREATE_TABLE)
+            for name in missing:
+                cursor.execute(TRIGGERS[name])
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) '
+                "VALUES ('rebuild')"
+            )
+    return True
+
+
+def clear_search_index():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) '
+            "VALUES ('delete-all')"
+        )
+
+
+def index_posts(post_ids):
+    """Добавляет в индекс тексты постов с указанными id."""
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE}(rowid, text) '
+            f'SELECT id, text FROM posts_post WHERE id IN ({placeholders})',
+            list(post_ids)
+        )
+
+
+def build_match(query):
+    """
+    Превращает пользовательский ввод в выражение MATCH: каждое слово
+    берётся в кавычки и ищется по префиксу, а синтаксис FTS5
+    пользователю недоступен.
+    """
+    terms = TERM_RE.findall(query)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(query):
+    """Подзапрос с id подходящих постов для фильтра pk__in."""
+    match = build_match(query)
+    if not match or not search_available():
+        return None
+    return RawSQL(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        [match]
+    )
+
+
+def encode_search_cursor(rank, post_id):
+    return signing.dumps([rank, post_id], salt=SEARCH_SALT)
+
+
+def decode_search_cursor(token):
+    try:
+        rank, post_id = signing.loads(token, salt=SEARCH_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if not isinstance(rank, float) or not isinstance(post_id, int):
+        return None
+    return rank, post_id
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(
+            MARK_END, '</mark>'
+        )
+    )
+
+
+def search_posts(query, cursor=None, limit=LIMIT_POST):
+    """
+    Ищет посты по релевантности (bm25) и отдаёт страницу результатов
+    и курсор следующей страницы. Пагинация по ключу (rank, id),
+    без OFFSET и COUNT(*).
+    """
+    from .models import LISTING_DEFERRED_FIELDS, Post
+
+    match = build_match(query)
+    if not match or not search_supported():
+        return [], None
+    sql = (
+        'SELECT rowid, rank, snippet('
+        f'{SEARCH_TABLE}, 0, %s, %s, %s, %s) '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    )
+    params = [MARK_START, MARK_END, '…', SNIPPET_TOKENS, match]
+    position = decode_search_cursor(cursor) if cursor else None
+    if position is not None:
+        rank, post_id = position
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, post_id]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit + 1)
+    try:
+        # Без поисковой таблицы (откат миграции) поиск пуст, а не падает.
+        # Точка сохранения не даёт ошибке сломать транзакцию запроса.
+        with transaction.atomic(), connection.cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            rows = db_cursor.fetchall()
+    except OperationalError:
+        return [], None
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1][1], rows[-1][0])
+    posts = Post.objects.select_related('author', 'group').defer(
+        *LISTING_DEFERRED_FIELDS
+    ).in_bulk(
+        [row[0] for row in rows]
+    )
+    results = []
+    for post_id, _, snippet in rows:
+        post = posts.get(post_id)
+        if post is not None:
+            post.snippet = highlight(snippet)
+            results.append(post)
+    return results, next_cursor
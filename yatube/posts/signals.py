@@ -0,0 +1,185 @@
+from core.cache import bump_generation_on_commit
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from jobs.queue import enqueue, task
+
+from .counters import update_comment_count, update_user_stats
+from .models import Comment, FeedEntry, Follow, Group, Post, User, UserStats
+from .search import ensure_search_index
+from .thumbnails import delete_unused_image
+
+FEED_BATCH_SIZE = 500
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_LIMIT = 1000
+# Больше стольких подписчиков пост раскладывается по лентам в очереди.
+FEED_SYNC_FAN_OUT = 500
+# Ленты ждут живые читатели: выше прочих задач, кроме миниатюр.
+FEED_PRIORITY = 5
+
+
+def add_to_feeds(post_id, author_id, pub_date, follower_ids):
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for user_id in follower_ids
+        ],
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+@task
+def fan_out(post_id):
+    """Раскладывает пост по лентам всех подписчиков автора пачками."""
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date'
+    ).first()
+    if post is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=post['author_id']
+    ).order_by('user_id').values_list('user_id', flat=True)
+    last_id = 0
+    while True:
+        follower_ids = list(
+            followers.filter(user_id__gt=last_id)[:FEED_BATCH_SIZE]
+        )
+        if not follower_ids:
+            return
+        add_to_feeds(
+            post_id, post['author_id'], post['pub_date'], follower_ids
+        )
+        last_id = follower_ids[-1]
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """
+    Раскладывает новый пост по лентам подписчиков автора. У автора
+    с большим числом подписчиков это делает задача очереди, чтобы
+    запрос на создание поста не ждал тысячи вставок.
+    """
+    if not created:
+        return
+    follower_ids = list(Follow.objects.filter(
+        author_id=instance.author_id
+    ).values_list('user_id', flat=True)[:FEED_SYNC_FAN_OUT + 1])
+    if len(follower_ids) > FEED_SYNC_FAN_OUT:
+        enqueue(
+            fan_out, {'post_id': instance.pk},
+            priority=FEED_PRIORITY, dedupe_key=f'fan-out:{instance.pk}'
+        )
+        return
+    add_to_feeds(
+        instance.pk, instance.author_id, instance.pub_date, follower_ids
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Добавляет в ленту подписчика последние посты автора."""
+    if not created:
+        return
+    posts = Post.objects.filter(
+        author_id=instance.author_id
+    ).values_list('id', 'pub_date')[:FEED_BACKFILL_LIMIT]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=instance.user_id,
+                post_id=post_id,
+                author_id=instance.author_id,
+                pub_date=pub_date
+            )
+            for post_id, pub_date in posts
+        ],
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    FeedEntry.objects.filter(
+        user_id=instance.user_id,
+        author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_user_stats(instance.author_id, post_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    update_user_stats(instance.author_id, post_count=-1)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    """Удаляет картинку поста, когда на неё не ссылается ни один пост."""
+    if instance.image:
+        name = instance.image.name
+        enqueue(
+            delete_unused_image, {'name': name},
+            dedupe_key=f'delete-image:{name}'
+        )
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    update_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_user_stats(instance.author_id, follower_count=1)
+        update_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    update_user_stats(instance.author_id, follower_count=-1)
+    update_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_pages(sender, **kwargs):
+    """Любая запись контента сбрасывает кеш страниц."""
+    bump_generation_on_commit()
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, app_config, using, **kwargs):
+    """Возвращает поисковые триггеры, если миграция пересоздала таблицу."""
+    if app_config.label == 'posts':
+        ensure_search_index(connections[using])
@@ -0,0 +1,35 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Называет файлы по SHA-256 содержимого: posts/ab/abcd….png.
+    Одинаковые загрузки ложатся в один файл, а значит, и в один набор
+    миниатюр: sorl строит их имена по имени исходника. Поэтому файл
+    удаляется только вместе с последним постом, который на него
+    ссылается (posts.thumbnails.delete_unused_image).
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # Тот же файл уже загружен: второй раз его не пишем, а только
+        # обновляем время изменения. По нему delete_unused_image
+        # не удалит файл, пока пост с ним ещё не закоммичен.
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
@@ -0,0 +1,77 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.forms import CommentForm
+from posts.models import Follow
+from posts.thumbnails import get_ready_thumbnail, get_ready_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def comment_form():
+    return CommentForm()
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author_id):
+    user = context['user']
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author_id=author_id
+    ).exists()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image, size):
+    """
+    Готовая миниатюра размера из THUMBNAIL_SIZES или None. Берётся
+    из thumbnails, если страница уже получила их пачкой.
+    """
+    if not image:
+        return None
+    ready = context.get('thumbnails', {}).get(size, {})
+    if image.name in ready:
+        return ready[image.name]
+    return get_ready_thumbnail(image, size)
+
+
+def card_cache_key(post, visibility):
+    # updated_at меняется при любой правке, влияющей на карточку,
+    # поэтому старые версии не удаляем: они просто перестают читаться.
+    version = int(post.updated_at.timestamp() * 1000000)
+    return f'post-card:{post.pk}:{version}:{int(visibility is not False)}'
+
+
+@register.simple_tag
+def post_cards(posts, visibility=None):
+    """
+    Пары (пост, HTML карточки) для страницы постов: готовые карточки
+    читаются из кеша одним get_many, недостающие рисуются и кладутся
+    в кеш одним set_many.
+    """
+    posts = list(posts)
+    keys = [card_cache_key(post, visibility) for post in posts]
+    cached = cache.get_many(keys)
+    stale = [
+        (post, key) for post, key in zip(posts, keys) if key not in cached
+    ]
+    if stale:
+        # Миниатюры всех недостающих карточек читаются одной пачкой.
+        context = {
+            'visibility': visibility,
+            'thumbnails': {'card': get_ready_thumbnails(
+                [post.image for post, key in stale], 'card'
+            )},
+        }
+        rendered = {
+            key: render_to_string(
+                'includes/generator_card.html', dict(context, post=post)
+            )
+            for post, key in stale
+        }
+        cache.set_many(rendered, settings.CARD_CACHE_TIMEOUT)
+        cached.update(rendered)
+    return [(post, mark_safe(cached[key])) for post, key in zip(posts, keys)]
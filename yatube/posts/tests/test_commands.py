@@ -0,0 +1,165 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.models import KVStore
+
+from ..models import FeedEntry, Follow, Post, User, UserStats
+from ..thumbnails import generate_thumbnails, get_ready_thumbnail
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageCollectorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='auth')
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            author=user,
+            text='Пост',
+            image=SimpleUploadedFile('kept.png', buffer.getvalue())
+        )
+        generate_thumbnails(self.post.image.name)
+        self.storage = self.post.image.storage
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'blue').save(buffer, 'PNG')
+        self.orphan = self.storage.save(
+            'posts/orphan.png', ContentFile(buffer.getvalue())
+        )
+        generate_thumbnails(self.orphan)
+        self.orphan_thumbnail = default.storage.save(
+            'cache/00/00/orphan.jpg', ContentFile(b'jpeg')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def collect(self, **options):
+        out = StringIO()
+        call_command(
+            'collect_media_garbage', min_age=0, pause=0, stdout=out,
+            **options
+        )
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        """С --dry-run команда только считает."""
+        rows = KVStore.objects.count()
+        output = self.collect(dry_run=True)
+        self.assertIn('Будет удалено картинок: 1, миниатюр: 1', output)
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assertTrue(default.storage.exists(self.orphan_thumbnail))
+        self.assertEqual(KVStore.objects.count(), rows)
+
+    def test_unreferenced_media_is_deleted(self):
+        """Удаляются только файлы и записи, на которые никто не ссылается."""
+        orphan_thumbnail = get_ready_thumbnail(
+            Post(image=self.orphan).image, 'card'
+        )
+        self.collect()
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assertFalse(default.storage.exists(self.orphan_thumbnail))
+        self.assertFalse(default.storage.exists(orphan_thumbnail.name))
+        self.assertTrue(self.storage.exists(self.post.image.name))
+        kept = get_ready_thumbnail(self.post.image, 'card')
+        self.assertTrue(default.storage.exists(kept.name))
+        self.assertFalse(
+            KVStore.objects.filter(value__contains='orphan').exists()
+        )
+
+    def test_stale_kvstore_rows_are_deleted(self):
+        """Записи kvstore о пропавших миниатюрах удаляются."""
+        thumbnail = get_ready_thumbnail(self.post.image, 'card')
+        default.storage.delete(thumbnail.name)
+        self.collect()
+        self.assertFalse(
+            KVStore.objects.filter(value__contains=thumbnail.name).exists()
+        )
+
+
+class SeedCommandTest(TestCase):
+    options = {
+        'users': 30,
+        'groups': 3,
+        'posts': 120,
+        'comments': 60,
+        'follows': 4,
+        'seed': 42,
+        'batch_size': 25,
+    }
+
+    def seed(self):
+        call_command('seed_yatube', stdout=StringIO(), **self.options)
+        return list(Post.objects.order_by('pk').values_list(
+            'author__username', 'text', 'group__slug'
+        ))
+
+    def test_seed_fills_consistent_data(self):
+        """seed_yatube создаёт данные с согласованными счётчиками и лентами."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertFalse(Post.objects.filter(preview='').exists())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user=follow.user, author=follow.author
+            ).count(),
+            Post.objects.filter(author=follow.author).count()
+        )
+        for stats in UserStats.objects.all():
+            self.assertEqual(
+                stats.post_count,
+                Post.objects.filter(author=stats.user).count()
+            )
+            self.assertEqual(
+                stats.follower_count,
+                Follow.objects.filter(author=stats.user).count()
+            )
+
+    def test_seed_limits_feed_backfill(self):
+        """В ленту попадают только последние посты автора, как при подписке."""
+        with mock.patch(
+            'posts.management.commands.seed_yatube.FEED_BACKFILL_LIMIT', 2
+        ):
+            self.seed()
+        for follow in Follow.objects.all():
+            latest = Post.objects.filter(
+                author=follow.author_id
+            ).values_list('pk', flat=True)[:2]
+            self.assertEqual(
+                set(FeedEntry.objects.filter(
+                    user=follow.user_id, author=follow.author_id
+                ).values_list('post', flat=True)),
+                set(latest)
+            )
+
+    def test_seed_reports_inserted_rows(self):
+        """Команда печатает, сколько строк реально добавлено."""
+        output = StringIO()
+        call_command('seed_yatube', stdout=output, **self.options)
+        self.assertIn(f'Постов: {Post.objects.count()}', output.getvalue())
+        self.assertIn(
+            f'Подписок: {Follow.objects.count()}', output.getvalue()
+        )
+
+    def test_seed_is_reproducible(self):
+        """С одним и тем же зерном получаются одни и те же данные."""
+        with transaction.atomic():
+            first = self.seed()
+            transaction.set_rollback(True)
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.seed(), first)
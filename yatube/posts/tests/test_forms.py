@@ -1,12 +1,17 @@
+import os
 import shutil
+import struct
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from posts.forms import PostForm
 from posts.models import Group, Post, User
+from PIL import Image
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -73,3 +78,123 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post_edit.author, self.user)
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(post_edit.text, form_data['text'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Bob')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, size=(40, 20), format_='PNG', noise=False, **options):
+        if noise:
+            image = Image.frombytes(
+                'RGB', size, os.urandom(3 * size[0] * size[1])
+            )
+        else:
+            image = Image.new('RGB', size, 'red')
+        buffer = BytesIO()
+        image.save(buffer, format_, **options)
+        return SimpleUploadedFile(
+            f'picture.{format_.lower()}', buffer.getvalue(),
+            content_type=f'image/{format_.lower()}'
+        )
+
+    def create(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с картинкой', 'image': image}
+        )
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        """Файл больше MAX_UPLOAD_SIZE не сохраняется, форма объясняет"""
+        response = self.create(self.upload(size=(64, 64), noise=True))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1,0\xa0КБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_are_rejected(self):
+        """Картинка с большим разрешением отклоняется по заголовку"""
+        response = self.create(self.upload())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Слишком большое разрешение картинки: 40x20.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_large_image_is_downscaled(self):
+        """Большая сторона картинки уменьшается до POST_IMAGE_MAX_SIDE"""
+        self.create(self.upload())
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (10, 5))
+
+    def test_read_only_format_is_stored_as_png(self):
+        """Формат, в который Pillow не пишет, перекодируется в PNG"""
+        header = struct.pack('>8I', 0x59A66A95, 4, 2, 8, 8, 1, 0, 0)
+        self.create(SimpleUploadedFile(
+            'picture.ras', header + bytes(range(8)),
+            content_type='image/x-sun-raster'
+        ))
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.png'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (4, 2)))
+
+    def animation(self, size, frames=2):
+        buffer = BytesIO()
+        first, *rest = [
+            Image.new('RGB', size, color)
+            for color in ['red', 'blue', 'green'][:frames]
+        ]
+        first.save(
+            buffer, 'GIF', save_all=True, append_images=rest,
+            duration=50, loop=0, comment=b'GPS 55.75 37.61'
+        )
+        return SimpleUploadedFile(
+            'animation.gif', buffer.getvalue(), content_type='image/gif'
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_animation_is_resized_and_stripped(self):
+        """Анимация уменьшается покадрово и теряет метаданные"""
+        self.create(self.animation((40, 20)))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (10, 5))
+            self.assertEqual(image.n_frames, 2)
+            self.assertNotIn('comment', image.info)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=40 * 20 * 2)
+    def test_long_animation_is_rejected(self):
+        """Анимация с большим числом пикселей во всех кадрах отклоняется"""
+        response = self.create(self.animation((40, 20), frames=3))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Слишком длинная анимация: 3 кадров 40x20.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_exif_is_applied_and_stripped(self):
+        """Поворот из EXIF применяется, а сами метаданные не хранятся"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        self.create(self.upload(format_='JPEG', exif=exif.tobytes()))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertNotIn('exif', image.info)
@@ -1,10 +1,23 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from jobs.queue import claim, run_job
+from PIL import Image
 
-from ..models import Group, Post
+from ..models import (PREVIEW_LENGTH, Comment, FeedEntry, Follow, Group, Post,
+                      UserStats)
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -44,3 +57,195 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).verbose_name, expected_value
                 )
+
+
+class PostRenderedTextTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer')
+
+    def test_preview_is_escaped_and_linebroken(self):
+        """Превью хранится экранированным и с переносами строк."""
+        post = Post.objects.create(author=self.user, text='<b>Раз</b>\nДва')
+        self.assertEqual(post.preview, '&lt;b&gt;Раз&lt;/b&gt;<br>Два')
+        self.assertEqual(post.text_html, post.preview)
+        self.assertFalse(post.preview_truncated)
+
+    def test_long_text_is_truncated(self):
+        """Длинный текст обрезается, а правка текста обновляет превью."""
+        post = Post.objects.create(author=self.user, text='а' * 1000)
+        self.assertEqual(len(post.preview), PREVIEW_LENGTH)
+        self.assertTrue(post.preview_truncated)
+        self.assertEqual(post.text_html, post.text)
+        post.text = 'Короткий'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.preview, 'Короткий')
+        self.assertEqual(post.text_html, 'Короткий')
+        self.assertFalse(post.preview_truncated)
+
+    def test_rebuild_post_html_command(self):
+        """rebuild_post_html досчитывает HTML постов из bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Строка {number}\nещё строка')
+            for number in range(3)
+        )
+        call_command(
+            'rebuild_post_html', missing=True, batch_size=2, stdout=StringIO()
+        )
+        for post in Post.objects.all():
+            self.assertEqual(post.text_html, post.text.replace('\n', '<br>'))
+            self.assertEqual(post.preview, post.text_html)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageMetadataTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name='picture.png', size=(40, 20)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(
+            name, buffer.getvalue(), content_type='image/png'
+        )
+
+    def test_upload_stores_size_and_placeholder(self):
+        """При загрузке картинки сохраняются её размеры и заглушка."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload()
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.assertLess(len(post.image_placeholder), 1000)
+
+    def test_removing_image_clears_metadata(self):
+        """Без картинки размеры и заглушка сбрасываются."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload()
+        )
+        post.image = None
+        post.save(update_fields=['image'])
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_rebuild_command_fills_old_posts(self):
+        """rebuild_image_metadata дописывает размеры старым постам."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload(size=(8, 16))
+        )
+        Post.objects.create(
+            author=self.user, text='Пропавший файл', image='posts/gone.png'
+        )
+        Post.objects.update(
+            image_width=None, image_height=None, image_placeholder=''
+        )
+        call_command('rebuild_image_metadata', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (8, 16))
+        self.assertTrue(post.image_placeholder)
+
+
+class FeedEntryModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост'
+        )
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.reader, post=self.old_post
+            ).exists()
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        entry = FeedEntry.objects.filter(user=self.reader).first()
+        self.assertEqual(entry.post, post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.assertFalse(FeedEntry.objects.filter(user=self.author).exists())
+
+    def test_large_fan_out_runs_in_queue(self):
+        """Пост автора с множеством подписчиков раскладывает задача."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        with mock.patch('posts.signals.FEED_SYNC_FAN_OUT', 1), \
+                mock.patch('posts.signals.FEED_BATCH_SIZE', 1):
+            post = Post.objects.create(author=self.author, text='Новый пост')
+            self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+            self.assertEqual(run_job(claim(60)), 'done')
+        self.assertEqual(
+            set(FeedEntry.objects.filter(post=post).values_list(
+                'user', flat=True
+            )),
+            {self.reader.pk, other.pk}
+        )
+
+    def test_unfollow_trims_feed(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики обновляются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.post_count, 2)
+        self.assertEqual(stats.follower_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.post_count, 1)
+        self.assertEqual(stats.follower_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """rebuild_counters восстанавливает испорченные счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        UserStats.objects.all().delete()
+        Post.objects.update(comment_count=0)
+        call_command('rebuild_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).post_count, 1
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
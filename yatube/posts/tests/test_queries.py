@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from .utils import query_budget
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов страниц не зависит от числа постов на странице."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        groups = [
+            Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group-{i}',
+                description='Описание'
+            )
+            for i in range(2)
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(15):
+            Post.objects.create(
+                author=authors[i % 3],
+                group=groups[i % 2],
+                text=f'Пост {i}'
+            )
+        cls.post = Post.objects.first()
+        for i, author in enumerate(authors):
+            Comment.objects.create(
+                post=cls.post, author=author, text=f'Комментарий {i}'
+            )
+        cls.author = authors[0]
+        cls.group = groups[0]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_urls(self):
+        return [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+
+    def test_listing_query_budgets(self):
+        # Сессия и пользователь занимают первые два запроса.
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 5,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 6,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): 4,
+            reverse('posts:follow_index'): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with query_budget(self, budget):
+                    self.client.get(url)
+
+    def test_listings_do_not_load_full_text(self):
+        """Списки постов читают превью, а не полный текст"""
+        urls = [
+            url for url in self.get_urls()
+            if url != reverse('posts:post_detail', args=[self.post.id])
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    self.client.get(url)
+                for query in context.captured_queries:
+                    self.assertNotIn('"posts_post"."text"', query['sql'])
+                    self.assertNotIn(
+                        '"posts_post"."text_html"', query['sql']
+                    )
+
+    def test_main_queries_use_indexes(self):
+        """Запросы к постам, ленте и комментариям идут по индексам."""
+        for url in self.get_urls():
+            cache.clear()
+            with query_budget(self, 10) as context:
+                self.client.get(url)
+            for query in context.captured_queries:
+                sql = query['sql']
+                if 'FROM "posts_' not in sql:
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = [row[-1] for row in cursor.fetchall()]
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step, plan)
+                        if step.startswith('SCAN'):
+                            self.assertIn('USING', step, plan)
@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import SEARCH_TABLE, ensure_search_index, search_posts
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='searcher')
+        self.match = Post.objects.create(
+            author=self.user,
+            text='Река течёт <b>быстро</b>, речка журчит'
+        )
+        self.other = Post.objects.create(
+            author=self.user,
+            text='Совсем другая запись'
+        )
+
+    def test_index_follows_post_changes(self):
+        """Триггеры держат индекс в актуальном состоянии"""
+        results, _ = search_posts('река')
+        self.assertEqual(results, [self.match])
+        Post.objects.filter(pk=self.other.pk).update(text='Тоже про реку')
+        results, _ = search_posts('реку')
+        self.assertEqual(results, [self.other])
+        self.match.delete()
+        results, _ = search_posts('река')
+        self.assertEqual(results, [])
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        """Сниппет экранирует текст поста и подсвечивает найденное"""
+        results, _ = search_posts('быстро')
+        snippet = results[0].snippet
+        self.assertIn('<mark>быстро</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        results, _ = search_posts('река" *(')
+        self.assertEqual(results, [self.match])
+        self.assertEqual(search_posts('""*'), ([], None))
+
+    def test_keyset_pagination(self):
+        """Курсор отдаёт следующую страницу без повторов"""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Озеро номер {number}')
+            for number in range(5)
+        )
+        first, cursor = search_posts('озеро', limit=3)
+        second, last_cursor = search_posts('озеро', cursor, limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты"""
+        response = self.client.get(reverse('posts:search'), {'q': 'река'})
+        self.assertEqual(response.context['results'], [self.match])
+        self.assertContains(response, '<mark>Река</mark>')
+
+    def test_rebuild_search_index_command(self):
+        """Команда перестраивает индекс с нуля"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(search_posts('река'), ([], None))
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        results, _ = search_posts('река')
+        self.assertEqual(results, [self.match])
+
+    def test_missing_index_returns_no_results(self):
+        """Без поисковой таблицы поиск пуст, а не падает"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {SEARCH_TABLE}')
+        self.assertEqual(search_posts('река'), ([], None))
+        response = self.client.get(reverse('posts:search'), {'q': 'река'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['results'], [])
+
+    def test_search_does_not_read_schema(self):
+        """Поиск не смотрит схему базы на каждом запросе"""
+        with mock.patch.object(
+            connection.introspection, 'table_names'
+        ) as table_names:
+            results, _ = search_posts('река')
+        self.assertEqual(results, [self.match])
+        table_names.assert_not_called()
+
+    def test_sqlite_without_fts5(self):
+        """Без FTS5 в SQLite поиск пуст, а индекс не создаётся"""
+        with mock.patch('posts.search.fts5_compiled', return_value=False):
+            self.assertEqual(search_posts('река'), ([], None))
+            self.assertFalse(ensure_search_index())
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import work
+from PIL import Image
+
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def run_jobs():
+    work(threading.Event(), 0, 60, burst=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def png(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def create_post(self, name, color='red'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост',
+            image=SimpleUploadedFile(
+                name, self.png(color), content_type='image/png'
+            )
+        )
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки под разными именами хранятся одним файлом."""
+        first = self.create_post('first.png')
+        second = self.create_post('second.PNG')
+        other = self.create_post('first.png', color='blue')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(first.image.name.startswith('posts/'))
+        self.assertTrue(first.image.name.endswith('.png'))
+
+    @override_settings(POST_IMAGE_DELETE_GRACE=0)
+    def test_file_is_deleted_with_last_post(self):
+        """Файл удаляется только вместе с последним постом, где он есть."""
+        first = self.create_post('first.png')
+        second = self.create_post('second.png')
+        storage = first.image.storage
+        name = first.image.name
+        first.delete()
+        run_jobs()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        run_jobs()
+        self.assertFalse(storage.exists(name))
+
+    def test_reupload_keeps_file_from_pending_delete(self):
+        """Повторная загрузка не даёт удалить файл уже поставленной задаче."""
+        post = self.create_post('first.png')
+        storage = post.image.storage
+        name = post.image.name
+        hour_ago = time.time() - 60 * 60
+        os.utime(storage.path(name), (hour_ago, hour_ago))
+        post.delete()
+        # Пост с той же картинкой ещё не сохранён, а файл уже записан.
+        self.assertEqual(
+            storage.save('posts/again.png', ContentFile(self.png())), name
+        )
+        run_jobs()
+        self.assertTrue(storage.exists(name))
+
+    def test_delete_of_fresh_file_is_postponed(self):
+        """Удаление свежего файла откладывается, а не теряется."""
+        post = self.create_post('first.png')
+        storage = post.image.storage
+        name = post.image.name
+        post.delete()
+        run_jobs()
+        self.assertTrue(storage.exists(name))
+        job = Job.objects.get()
+        self.assertEqual(job.attempts, 0)
+        self.assertGreater(
+            job.run_at, timezone.now() + timedelta(
+                seconds=settings.POST_IMAGE_DELETE_GRACE - 60
+            )
+        )
+        # Срок вышел, а пост с этой картинкой так и не появился.
+        hour_ago = time.time() - 60 * 60
+        os.utime(storage.path(name), (hour_ago, hour_ago))
+        Job.objects.update(run_at=timezone.now())
+        run_jobs()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(Job.objects.exists())
@@ -1,14 +1,29 @@
 import shutil
 import tempfile
+import threading
+from unittest import mock
 
+from core.cache import cache_page_versioned, get_generation, page_cache_key
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import OperationalError, transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template import Context, Template
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
 from django.urls import reverse
+from posts import thumbnails
 from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import (THUMBNAIL_SIZES, generate_thumbnails,
+                              get_ready_thumbnail, get_ready_thumbnails,
+                              size_variants)
+from posts.utils import NEXT, encode_cursor, paginator
+from sorl.thumbnail import get_thumbnail
 
 User = get_user_model()
 
@@ -346,28 +361,394 @@ class PostsMediaTest(TestCase):
         self.assertTrue(object.image)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestingAccount')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'thumb.gif', self.small_gif, content_type='image/gif'
+            )
+        )
+
+    def test_pending_thumbnail_renders_placeholder(self):
+        """Пока миниатюры нет, страница показывает заглушку"""
+        with mock.patch('posts.thumbnails.schedule_thumbnails') as schedule:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio')
+        schedule.assert_called_once_with(self.post.image.name)
+
+    def test_generated_thumbnail_is_read_from_kvstore(self):
+        """Шаблон отдаёт миниатюру, созданную при загрузке"""
+        generate_thumbnails(self.post.image.name)
+        geometry, options = THUMBNAIL_SIZES['card']
+        expected = get_thumbnail(self.post.image, geometry, **options)
+        thumbnail = get_ready_thumbnail(self.post.image, 'card')
+        self.assertEqual(thumbnail.name, expected.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, expected.url)
+
+    def test_post_detail_placeholder_keeps_stored_size(self):
+        """Заглушка на странице поста в пропорциях оригинала"""
+        with mock.patch('posts.thumbnails.schedule_thumbnails'):
+            response = self.client.get(
+                reverse('posts:post_detail', args=[self.post.id])
+            )
+        self.assertContains(response, 'width: 2px; aspect-ratio: 2 / 1')
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_post_detail_shows_detail_thumbnail(self):
+        """На странице поста миниатюра без обрезки, а не оригинал"""
+        generate_thumbnails(self.post.image.name)
+        picture = get_ready_thumbnail(self.post.image, 'detail')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertContains(
+            response, f'src="{picture.url}" srcset="{picture.jpeg_srcset}"'
+        )
+        self.assertContains(response, 'width="2" height="1"')
+        self.assertNotContains(response, self.post.image.url)
+        # Маленький оригинал не увеличивается: одна ширина в srcset.
+        self.assertEqual(picture.jpeg_srcset, f'{picture.url} 2w')
+
+    def test_card_offers_every_width_in_srcset(self):
+        """Карточка перечисляет в srcset все ширины миниатюры"""
+        generate_thumbnails(self.post.image.name)
+        picture = get_ready_thumbnail(self.post.image, 'card')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, picture.jpeg_srcset)
+        for width in (480, 960):
+            self.assertIn(f' {width}w', picture.jpeg_srcset)
+
+    def test_variants_keep_aspect_ratio_in_every_format(self):
+        """Узкие варианты сохраняют пропорции и есть в каждом формате"""
+        with mock.patch(
+            'posts.thumbnails.THUMBNAIL_FORMATS', ('WEBP', 'JPEG')
+        ):
+            variants = size_variants('card')
+        self.assertEqual(variants[('WEBP', 480)][0], '480x170')
+        self.assertEqual(variants[('JPEG', 960)][0], '960x339')
+        self.assertEqual(variants[('WEBP', 960)][1]['format'], 'WEBP')
+        self.assertEqual(len(variants), 4)
+
+    def test_page_reads_thumbnails_in_one_batch(self):
+        """Миниатюры страницы читаются из kvstore одной пачкой"""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user,
+                text=f'Пост {number}',
+                image=SimpleUploadedFile(
+                    f'thumb{number}.gif', self.small_gif,
+                    content_type='image/gif'
+                )
+            )
+            for number in range(2)
+        ]
+        for post in posts:
+            generate_thumbnails(post.image.name)
+        cache.clear()
+        with mock.patch(
+            'posts.thumbnails.read_kvstore',
+            wraps=thumbnails.read_kvstore
+        ) as read_kvstore, mock.patch(
+            'posts.templatetags.posts_extras.get_ready_thumbnail'
+        ) as single_lookup:
+            response = self.client.get(reverse('posts:index'))
+        read_kvstore.assert_called_once()
+        single_lookup.assert_not_called()
+        for post in posts:
+            self.assertContains(
+                response, get_ready_thumbnail(post.image, 'card').url
+            )
+
+    def test_thumbnail_batch_misses_hit_database_once(self):
+        """Промахи кеша kvstore дочитываются одним запросом и кешируются"""
+        generate_thumbnails(self.post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            first = get_ready_thumbnails([self.post.image], 'card')
+        with self.assertNumQueries(0):
+            second = get_ready_thumbnails([self.post.image], 'card')
+        self.assertEqual(
+            first[self.post.image.name].name,
+            second[self.post.image.name].name
+        )
+
+    def test_post_create_schedules_thumbnails(self):
+        """Создание поста с картинкой ставит миниатюры в очередь"""
+        upload = SimpleUploadedFile(
+            'new.gif', self.small_gif, content_type='image/gif'
+        )
+        with mock.patch('posts.views.schedule_thumbnails') as schedule:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'image': upload}
+            )
+        post = Post.objects.get(text='Новый пост')
+        schedule.assert_called_once_with(post.image.name)
+
+
 class PostsCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='TestingAccount')
+        self.guest = Client()
+        cache.clear()
+
     def test_index_page_cache(self):
         """Проверка работы кеша"""
-        self.user = User.objects.create_user(username='TestingAccount')
-        guest = Client()
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        response = self.guest.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            cached_response = self.guest.get(reverse('posts:index'))
+        self.assertEqual(
+            response.content,
+            cached_response.content,
+            "Кеш не сохраняет шаблон"
+        )
+
+    def test_index_page_cache_invalidated_on_write(self):
+        """Удаление поста сразу сбрасывает кеш главной страницы"""
         database_post = Post.objects.create(
             author=self.user,
             text='Тестовый пост',
         )
-        response_before_delite = guest.get(reverse('posts:index'))
-        cache_post = response_before_delite.content.decode()
+        response_before_delete = self.guest.get(reverse('posts:index'))
         database_post.delete()
-        response_after_delite = guest.get(reverse('posts:index'))
-        self.assertEqual(
-            cache_post,
-            response_after_delite.content.decode(),
-            "Кеш не сохраняет шаблон"
-        )
+        response_after_delete = self.guest.get(reverse('posts:index'))
+        self.assertContains(response_before_delete, database_post.text)
+        self.assertNotContains(response_after_delete, database_post.text)
+
+    def test_concurrent_miss_waits_for_rebuild(self):
+        """Пока страницу пересобирают, другой запрос ждёт результат"""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        calls = []
+
+        @cache_page_versioned(60, key_prefix='test')
+        def view(request):
+            calls.append(request)
+            return HttpResponse('готово')
+
+        key = page_cache_key('test', request)
+        cache.add(f'{key}:lock', True)
+        rebuild = threading.Timer(
+            0.1, cache.set, (key, ('готово'.encode(), 'text/html'))
+        )
+        rebuild.start()
+        response = view(request)
+        rebuild.join()
+        self.assertEqual(response.content.decode(), 'готово')
+        self.assertEqual(calls, [])
+
+
+class PostsCacheCommitTest(TransactionTestCase):
+    def test_generation_bumped_again_after_commit(self):
+        """После коммита записи поколение сдвигается ещё раз"""
+        user = User.objects.create_user(username='TestingAccount')
+        with transaction.atomic():
+            Post.objects.create(author=user, text='Тестовый пост')
+            # Страница, собранная другим запросом до коммита, ляжет
+            # под этим поколением и не должна его пережить.
+            generation = get_generation()
+        self.assertGreater(get_generation(), generation)
+
+
+class LockedWriteRetryTest(TransactionTestCase):
+    def test_only_the_write_is_retried(self):
+        """При блокировке повторяется запись, а не весь view"""
+        user = User.objects.create_user(username='TestingAccount')
+        post = Post.objects.create(author=user, text='Тестовый пост')
+        client = Client()
+        client.force_login(user)
+        save = Comment.save
+        attempts = []
+
+        def locked_once(comment, *args, **kwargs):
+            attempts.append(comment)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return save(comment, *args, **kwargs)
+
+        lookup = mock.patch(
+            'posts.views.get_object_or_404', wraps=get_object_or_404
+        )
+        with mock.patch.object(Comment, 'save', locked_once), \
+                mock.patch('core.db.time.sleep'), lookup as lookup:
+            client.post(
+                reverse('posts:add_comment', args=[post.id]),
+                {'text': 'Комментарий'}
+            )
+        self.assertEqual(len(attempts), 2)
+        lookup.assert_called_once()
+        self.assertEqual(post.comments.count(), 1)
+
+
+class UserSectionCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='alice')
+        cls.reader = User.objects.create_user(username='bob')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
         cache.clear()
-        response_after_cache_cleaning = guest.get(reverse('posts:index'))
-        self.assertNotEqual(
-            cache_post,
-            response_after_cache_cleaning.content.decode(),
-            "Кеш не работает"
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cached_header_is_rendered_per_user(self):
+        """Закешированная страница не отдаёт чужую шапку"""
+        url = reverse('posts:index')
+        self.author_client.get(url)
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Пользователь: bob')
+        self.assertNotContains(response, 'Пользователь: alice')
+        response = self.client.get(url)
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Пользователь:')
+
+    def test_cached_post_detail_keeps_user_controls(self):
+        """Кнопка редактирования и форма комментария у каждого свои"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        edit_url = reverse('posts:post_edit', kwargs={'post_id': self.post.id})
+        response = self.author_client.get(url)
+        self.assertContains(response, edit_url)
+        response = self.reader_client.get(url)
+        self.assertNotContains(response, edit_url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        response = self.client.get(url)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_cached_profile_shows_follow_state(self):
+        """Кнопка подписки отражает подписку текущего пользователя"""
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.reader_client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Отписаться')
+        response = self.author_client.get(url)
+        self.assertNotContains(response, 'Подписаться')
+
+
+class PostCardCacheTest(TestCase):
+    TEMPLATE = Template(
+        '{% load posts_extras %}{% post_cards posts as cards %}'
+        '{% for post, card in cards %}{{ card }}{% endfor %}'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestingAccount')
+        for number in range(3):
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        return self.TEMPLATE.render(Context({'posts': Post.objects.all()}))
+
+    def test_cards_are_read_with_one_get_many(self):
+        """Закешированные карточки читаются одним get_many без отрисовки"""
+        first = self.render()
+        with mock.patch.object(
+            cache, 'get_many', wraps=cache.get_many
+        ) as get_many, mock.patch(
+            'posts.templatetags.posts_extras.render_to_string'
+        ) as render_to_string:
+            self.assertEqual(self.render(), first)
+        get_many.assert_called_once()
+        render_to_string.assert_not_called()
+
+    def test_card_is_rebuilt_after_comment(self):
+        """Новый комментарий меняет счётчик в карточке"""
+        self.render()
+        Comment.objects.create(
+            post=Post.objects.first(), author=self.user, text='Комментарий'
+        )
+        self.assertIn('Комментариев: 1', self.render())
+
+    def test_card_is_rebuilt_after_edit(self):
+        """Правка поста видна в карточке"""
+        self.render()
+        post = Post.objects.first()
+        post.text = 'Исправленный пост'
+        post.save(update_fields=['text'])
+        self.assertIn('Исправленный пост', self.render())
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestingAccount')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
         )
+        cls.factory = RequestFactory()
+
+    def get_page(self, **params):
+        request = self.factory.get('/', params)
+        return paginator(request, Post.objects.all())
+
+    def test_cursor_walk_returns_every_post_once(self):
+        """Переходы по курсору проходят все посты по порядку."""
+        expected = list(Post.objects.values_list('id', flat=True))
+        first = self.get_page()
+        seen = [post.id for post in first]
+        cursor = encode_cursor(first[len(first) - 1], NEXT)
+        while cursor:
+            with self.assertNumQueries(1):
+                page = self.get_page(cursor=cursor)
+            seen.extend(post.id for post in page)
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        first = self.get_page()
+        second = self.get_page(cursor=encode_cursor(first[9], NEXT))
+        previous = self.get_page(cursor=second.previous_cursor)
+        self.assertEqual(list(previous), list(first))
+        self.assertFalse(previous.has_previous())
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        """Подделанный курсор открывает первую страницу."""
+        page = self.get_page(cursor='bad-token')
+        self.assertEqual(page.number, 1)
+
+    def test_profile_renders_cursor_page(self):
+        """Страница профиля открывается по курсору."""
+        first = self.get_page()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            {'cursor': encode_cursor(first[9], NEXT)}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '?cursor=')
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def query_budget(test_case, budget):
+    """Проваливает тест, если блок выполнил больше budget запросов."""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    executed = len(context.captured_queries)
+    if executed > budget:
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(context.captured_queries, 1)
+        )
+        test_case.fail(
+            f'Выполнено {executed} запросов при бюджете {budget}:\n{queries}'
+        )
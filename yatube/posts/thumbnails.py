@@ -0,0 +1,261 @@
+import time
+
+from core.cache import bump_generation_on_commit
+from core.metrics import Histogram
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from jobs.queue import Postpone, enqueue, task
+from PIL import features
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+# Все размеры, которые используют шаблоны: {% post_thumbnail %}
+# читает только их, а генерируются они заранее, при загрузке.
+# Размер без высоты ограничивает только ширину и сохраняет
+# пропорции оригинала.
+THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('960', {'upscale': False}),
+}
+# Каждый размер нарезается ещё и в меньшие ширины для srcset
+# с теми же пропорциями и в каждом формате для <picture>.
+THUMBNAIL_WIDTHS = (480,)
+# WebP, только если Pillow собран с libwebp; JPEG нужен всегда.
+THUMBNAIL_FORMATS = (
+    ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+)
+# Сколько не планировать повторную генерацию одной и той же картинки.
+SCHEDULE_TIMEOUT = 5 * 60
+# Миниатюры ждёт уже открытая страница, их берут раньше прочих задач.
+THUMBNAIL_PRIORITY = 10
+
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время генерации миниатюр одной картинки.'
+)
+
+
+class PrecomputedThumbnailBackend(ThumbnailBackend):
+    """Находит готовую миниатюру в kvstore, ничего не генерируя."""
+
+    def get_thumbnail_name(self, source, geometry_string, options):
+        # Те же умолчания, что и в ThumbnailBackend.get_thumbnail,
+        # чтобы имя совпало с именем сгенерированного файла.
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def get_kvstore_key(self, file_, geometry_string, **options):
+        """Сырой ключ kvstore, под которым лежит миниатюра file_."""
+        source = ImageFile(file_)
+        name = self.get_thumbnail_name(source, geometry_string, options)
+        return add_prefix(ImageFile(name, default.storage).key)
+
+
+backend = PrecomputedThumbnailBackend()
+
+
+def image_source(name):
+    from .models import Post
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+class Picture:
+    """
+    Готовые варианты одной миниатюры. name, url и размеры берутся
+    у самого широкого JPEG: его получат браузеры без srcset.
+    """
+
+    def __init__(self, variants):
+        self.variants = variants
+        fallback = max(
+            (width, image) for (format_, width), image in variants.items()
+            if format_ == 'JPEG'
+        )[1]
+        self.name = fallback.name
+        self.width = fallback.width
+        self.height = fallback.height
+        self.fallback = fallback
+
+    @property
+    def url(self):
+        return self.fallback.url
+
+    def srcset(self, format_):
+        # Без увеличения маленький оригинал во всех вариантах одной
+        # ширины, а srcset описывает настоящие ширины файлов.
+        urls = {}
+        for (variant_format, width), image in sorted(self.variants.items()):
+            if variant_format == format_:
+                urls[image.width] = image.url
+        return ', '.join(f'{url} {width}w' for width, url in urls.items())
+
+    @property
+    def webp_srcset(self):
+        return self.srcset('WEBP')
+
+    @property
+    def jpeg_srcset(self):
+        return self.srcset('JPEG')
+
+
+def size_variants(size):
+    """Все варианты размера: {(формат, ширина): (geometry, options)}."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    width, _, height = geometry.partition('x')
+    width = int(width)
+    widths = {width} | {
+        narrow for narrow in THUMBNAIL_WIDTHS if narrow < width
+    }
+    return {
+        (format_, narrow): (
+            f'{narrow}x{round(int(height) * narrow / width)}'
+            if height else str(narrow),
+            dict(options, format=format_)
+        )
+        for format_ in THUMBNAIL_FORMATS
+        for narrow in widths
+    }
+
+
+@task
+def generate_thumbnails(name):
+    """Создаёт все миниатюры картинки и сбрасывает кеш страниц."""
+    from .models import Post
+    started = time.perf_counter()
+    source = image_source(name)
+    for size in THUMBNAIL_SIZES:
+        for geometry, options in size_variants(size).values():
+            default.backend.get_thumbnail(source, geometry, **options)
+    THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+    # Карточки постов с этой картинкой ключуются по updated_at.
+    Post.objects.filter(image=name).update(updated_at=timezone.now())
+    bump_generation_on_commit()
+
+
+def schedule_thumbnails(name):
+    """
+    Ставит генерацию миниатюр в очередь задач (jobs) в текущей
+    транзакции. dedupe_key не даёт поставить одну картинку дважды,
+    а отметка в кеше после коммита — писать в базу на каждой
+    отрисовке страницы, пока миниатюры не готовы.
+    """
+    key = f'thumbnails-scheduled:{name}'
+    if cache.get(key):
+        return
+    enqueue(
+        generate_thumbnails, {'name': name},
+        priority=THUMBNAIL_PRIORITY, dedupe_key=f'thumbnails:{name}'
+    )
+    transaction.on_commit(lambda: cache.set(key, True, SCHEDULE_TIMEOUT))
+
+
+def get_ready_thumbnail(image, size):
+    """Готовая миниатюра или None, если она ещё генерируется."""
+    return get_ready_thumbnails([image], size)[image.name]
+
+
+def read_kvstore(keys):
+    """
+    Сырые значения kvstore по ключам, пачкой: одним cache.get_many
+    и одним запросом к таблице для промахов кеша. Промахи кешируются
+    так же, как это делает сам sorl, чтобы не ходить в базу повторно.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        values = {key: kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in values.items() if value}
+    empty = cached_db_kvstore.EMPTY_VALUE
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kvstore.cache.set_many(
+            {key: found.get(key, empty) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(found)
+    return {key: value for key, value in values.items() if value != empty}
+
+
+def get_ready_thumbnails(images, size):
+    """
+    Готовые миниатюры пачки картинок одного размера:
+    {имя картинки: Picture или None}. Миниатюра готова, когда готовы
+    все её варианты; ключи всех вариантов читаются одной пачкой.
+    """
+    variants = size_variants(size)
+    keys = {
+        image.name: {
+            variant: backend.get_kvstore_key(image, geometry, **options)
+            for variant, (geometry, options) in variants.items()
+        }
+        for image in images if image
+    }
+    values = read_kvstore(list({
+        key for image_keys in keys.values() for key in image_keys.values()
+    }))
+    thumbnails = {}
+    for name, image_keys in keys.items():
+        if all(key in values for key in image_keys.values()):
+            thumbnails[name] = Picture({
+                variant: deserialize_image_file(values[key])
+                for variant, key in image_keys.items()
+            })
+        else:
+            thumbnails[name] = None
+            schedule_thumbnails(name)
+    return thumbnails
+
+
+def delete_if_unused(name, min_age):
+    """
+    Удаляет картинку вместе с миниатюрами, если на неё больше
+    не ссылается ни один пост: одинаковые загрузки делят один файл.
+    Файл моложе min_age секунд не трогается, тогда возвращается,
+    через сколько секунд его можно будет удалить.
+    """
+    from .models import Post
+    if Post.objects.filter(image=name).exists():
+        return None
+    source = image_source(name)
+    if source.exists():
+        # Свежий файл мог только что получить новый, ещё не закоммиченный
+        # пост: ContentAddressedStorage обновляет время изменения при
+        # повторной загрузке.
+        modified = source.storage.get_modified_time(name)
+        age = (timezone.now() - modified).total_seconds()
+        if age < min_age:
+            return min_age - age
+    delete(source)
+    return None
+
+
+@task
+def delete_unused_image(name):
+    """
+    delete_if_unused с POST_IMAGE_DELETE_GRACE: удаление свежего
+    файла откладывается до конца срока, а не теряется.
+    """
+    wait = delete_if_unused(name, settings.POST_IMAGE_DELETE_GRACE)
+    if wait:
+        raise Postpone(wait)
@@ -1,10 +1,142 @@
-from django.core.paginator import Paginator
+from core.memo import memoize
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+
+from .models import Group, User
 
 LIMIT_POST = 10
+# Столько первых страниц доступно по номеру, дальше навигация идёт
+# по курсору, чтобы не платить за OFFSET на глубоких страницах.
+NUMBERED_PAGES = 5
+CURSOR_SALT = 'posts.cursor'
+NEXT = 'next'
+PREVIOUS = 'prev'
+
+
+def encode_cursor(obj, direction):
+    """Непрозрачный подписанный курсор по ключу (pub_date, pk)."""
+    return signing.dumps(
+        [obj.pub_date.isoformat(), obj.pk, direction],
+        salt=CURSOR_SALT
+    )
+
+
+def decode_cursor(token):
+    try:
+        pub_date, pk, direction = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    pub_date = parse_datetime(pub_date)
+    if pub_date is None or direction not in (NEXT, PREVIOUS):
+        return None
+    return pub_date, pk, direction
+
+
+class CursorPage(Page):
+    """Страница, полученная по курсору: без номера и без COUNT(*)."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list:
+            if has_next:
+                self.next_cursor = encode_cursor(object_list[-1], NEXT)
+            if has_previous:
+                self.previous_cursor = encode_cursor(object_list[0], PREVIOUS)
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """
+    Paginator с двумя режимами: по номеру страницы для первых
+    NUMBERED_PAGES страниц и по курсору (pub_date, pk) для остальных.
+    """
+
+    @property
+    def numbered_range(self):
+        return range(1, min(self.num_pages, NUMBERED_PAGES) + 1)
+
+    def _get_page(self, object_list, number, paginator):
+        page = Page(list(object_list), number, paginator)
+        page.next_cursor = None
+        if number >= NUMBERED_PAGES and page.object_list:
+            page.next_cursor = encode_cursor(page.object_list[-1], NEXT)
+        return page
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token)
+        if cursor is None:
+            return self.get_page(1)
+        pub_date, pk, direction = cursor
+        queryset = self.object_list.order_by('-pub_date', '-pk')
+        if direction == NEXT:
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            return CursorPage(rows, self, has_more, True)
+        rows.reverse()
+        return CursorPage(rows, self, True, has_more)
 
 
 def paginator(request, queryset):
-    paginator = Paginator(queryset, LIMIT_POST)
+    paginator = CursorPaginator(queryset, LIMIT_POST)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def get_author(username):
+    """Пользователь по username со счётчиками, один раз за запрос."""
+    return memoize(
+        ('author', username),
+        lambda: get_object_or_404(
+            User.objects.select_related('stats'), username=username
+        )
+    )
+
+
+def get_group(slug):
+    """Группа по slug, один раз за запрос."""
+    return memoize(
+        ('group', slug), lambda: get_object_or_404(Group, slug=slug)
+    )
+
+
+def iter_id_batches(queryset, batch_size):
+    """Отдаёт первичные ключи queryset пачками, без OFFSET."""
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_id).order_by('pk').values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
@@ -1,15 +1,22 @@
+from core.cache import cache_page_versioned
+from core.db import retry_on_locked
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator
+from .models import LISTING_DEFERRED_FIELDS, Comment, Follow, Post
+from .search import search_posts
+from .thumbnails import schedule_thumbnails
+from .utils import get_author, get_group, paginator
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='index_page')
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.select_related('author', 'group').defer(
+        *LISTING_DEFERRED_FIELDS
+    )
     page_obj = paginator(request, posts)
     context = {
         'page_obj': page_obj,
@@ -18,9 +25,12 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='group_page')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author', 'group')
+    group = get_group(slug)
+    posts = group.posts.select_related('author', 'group').defer(
+        *LISTING_DEFERRED_FIELDS
+    )
     page_obj = paginator(request, posts)
     return render(
         request,
@@ -32,12 +42,13 @@ def group_posts(request, slug):
     )
 
 
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='profile_page')
 def profile(request, username):
-    posts = Post.objects.select_related('author').filter(
-        author__username=username
+    author = get_author(username)
+    posts = author.posts.select_related('author', 'group').defer(
+        *LISTING_DEFERRED_FIELDS
     )
     page_obj = paginator(request, posts)
-    author = get_object_or_404(User, username=username)
     context = {
         'author': author,
         'posts': posts,
@@ -46,8 +57,21 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@cache_page_versioned(settings.PAGE_CACHE_TIMEOUT, key_prefix='post_page')
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related(
+            'author__stats', 'group'
+        ).prefetch_related(
+            Prefetch(
+                'comments',
+                queryset=Comment.objects.select_related(
+                    'author'
+                ).order_by('created')
+            )
+        ),
+        id=post_id
+    )
     form = CommentForm()
     context = {
         'post': post,
@@ -56,6 +80,26 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results, next_cursor = search_posts(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+        'is_continued': bool(request.GET.get('cursor')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@retry_on_locked
+def save_post(post, image_changed):
+    """Сохраняет пост и в той же транзакции ставит миниатюры в очередь."""
+    post.save()
+    if image_changed and post.image:
+        schedule_thumbnails(post.image.name)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -65,7 +109,7 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        save_post(post, image_changed=True)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create_post.html', {"form": form})
 
@@ -81,7 +125,10 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        save_post(
+            form.save(commit=False),
+            image_changed='image' in form.changed_data
+        )
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -99,31 +146,41 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        retry_on_locked(comment.save)()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author',)
-    page_obj = paginator(request, posts)
+    entries = request.user.feed.only('user', 'post', 'pub_date')
+    page_obj = paginator(request, entries)
+    posts = Post.objects.select_related('author', 'group').defer(
+        *LISTING_DEFERRED_FIELDS
+    ).in_bulk([entry.post_id for entry in page_obj])
+    page_obj.object_list = [
+        posts[entry.post_id] for entry in page_obj
+        if entry.post_id in posts
+    ]
     return render(request, 'posts/follow.html', context={'page_obj': page_obj})
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if (Follow.objects.filter(user=request.user, author=author).exists()
-            or request.user == author):
+    author = get_author(username)
+    if request.user == author:
+        return redirect('posts:profile', username)
+    _, created = retry_on_locked(Follow.objects.get_or_create)(
+        user=request.user, author=author
+    )
+    if not created:
         return redirect('posts:profile', username)
-    Follow.objects.create(user=request.user, author=author)
     return redirect('posts:follow_index')
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    author = get_author(username)
+    retry_on_locked(
+        Follow.objects.filter(user=request.user, author=author).delete
+    )()
     return redirect('posts:profile', username)
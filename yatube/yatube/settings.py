@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -44,12 +45,14 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'jobs.apps.JobsConfig',
 
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
+    'core.memo.RequestMemoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,12 +60,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 INTERNAL_IPS = [
     '127.0.0.1',
-] 
+]
 
 ROOT_URLCONF = 'yatube.urls'
 
@@ -72,7 +78,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,6 +95,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Тесты не трогают общий кеш и хранилище метрик запущенного сервера.
+TEST_RUNNER = 'core.testing.IsolatedTestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -97,9 +106,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, core.db.check_connections
+        # проверяет его в начале каждого.
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Выставляются каждому соединению (core.db.configure_sqlite). WAL
+# позволяет читать во время записи, busy_timeout заставляет писателя
+# подождать блокировку, а не сразу падать с "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+# Сколько раз core.db.retry_on_locked пробует записать при блокировке.
+SQLITE_WRITE_ATTEMPTS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -150,8 +176,69 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки сразу пишутся на диск, в памяти воркера их нет целиком.
+# Файл больше MAX_UPLOAD_SIZE перестаёт писаться на первом же лишнем
+# куске (core.uploads).
+FILE_UPLOAD_HANDLERS = ['core.uploads.SizeLimitUploadHandler']
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Картинки постов: больше POST_IMAGE_MAX_PIXELS отклоняются по
+# заголовку, не раскодируя, а стороны больше POST_IMAGE_MAX_SIDE
+# уменьшаются при загрузке (posts.images.prepare_upload).
+POST_IMAGE_MAX_PIXELS = 24_000_000
+POST_IMAGE_MAX_SIDE = 2560
+# Удаление картинки моложе стольких секунд delete_unused_image
+# откладывает: её может делить новый пост, ещё не закоммиченный
+# (posts.storage).
+POST_IMAGE_DELETE_GRACE = 10 * 60
+
+# Общий для всех процессов кеш: страницы инвалидируются сменой поколения
+# (core.cache), поэтому их можно держать долго. У файлового кеша add()
+# и incr() — это чтение и запись без блокировки: защита от одновременной
+# пересборки страницы здесь лишь по возможности, а в гонке двух записей
+# одна из смен поколения может потеряться. В продакшене нужен бэкенд
+# с атомарными add() и incr(), например memcached или redis.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.instrumentation.InstrumentedFileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Карточки постов ({% post_cards %}) ключуются по Post.updated_at.
+# Смену имени автора ключ не видит, её ограничивает время жизни.
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Очередь задач в базе (jobs), её выполняет manage.py run_workers.
+JOBS_WORKERS = 4
+JOBS_MAX_ATTEMPTS = 5
+JOBS_VISIBILITY_TIMEOUT = 5 * 60
+JOBS_RETRY_BASE_DELAY = 10
+JOBS_RETRY_MAX_DELAY = 60 * 60
+
+# Общее для воркеров хранилище метрик (core.metrics).
+METRICS_DB = os.path.join(tempfile.gettempdir(), 'yatube_metrics.sqlite3')
+
+# Строка с метриками каждого запроса из core.middleware. В тестах
+# логгер приглушает core.testing.IsolatedTestRunner.
+REQUEST_LOG_LEVEL = os.environ.get('YATUBE_REQUEST_LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.requests': {
+            'handlers': ['console'],
+            'level': REQUEST_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
@@ -3,6 +3,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core import views as core_views
+
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
@@ -10,6 +12,7 @@ urlpatterns = [
     path('', include('posts.urls', namespace='posts'), name='posts_index'),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', core_views.metrics, name='metrics'),
 ]
 
 handler404 = 'core.views.page_not_found'